@@ -2,23 +2,415 @@
 ## Source code by koda
 ## release 03/02/2025 --version 0.1
 
+import os
 import sys
 import re
+import ast
+import copy
+import json
+import zlib
+import time
+import shutil
+import hashlib
+import tempfile
+import tracemalloc
+from array import array
 from collections import Counter
+from contextlib import contextmanager, nullcontext
+from itertools import accumulate
+from concurrent.futures import ProcessPoolExecutor
+
+###CONFIG
+GAME_CONFIGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GAME_CONFIGS.txt")
+
+class GameConfig:
+    """
+    Location of the text blocks of a game, the values of a [config] block in GAME_CONFIGS.txt.
+
+    dedup_messages stores identical messages once, their pointers share the data.
+    ptr_table_aliases lists (from, to) pointer slots: slot "to" gets a copy of slot "from"
+    after the table is built, for games that read a pointer twice.
+    script_refs and ptr_table_refs list where the game code keeps the CPU address of the
+    block, a ROM offset for a little-endian word or a (low byte, high byte) pair of offsets.
+    They let insert_script move a block that no longer fits, see relocate_block.
+    """
+    def __init__(self, script_offset, script_size, charmap_offset, charmap_size, ptr_table_offset,
+                 ptr_table_size, ptr_table_sections, line_breaker=0x00, name="", section="", crc32=None,
+                 dedup_messages=False, ptr_table_aliases=(), script_refs=(), ptr_table_refs=()):
+        self.script_offset = script_offset
+        self.script_size = script_size
+        self.charmap_offset = charmap_offset
+        self.charmap_size = charmap_size
+        self.ptr_table_offset = ptr_table_offset
+        self.ptr_table_size = ptr_table_size
+        self.ptr_table_sections = ptr_table_sections
+        self.line_breaker = line_breaker
+        self.name = name
+        self.section = section
+        self.crc32 = crc32
+        self.dedup_messages = dedup_messages
+        self.ptr_table_aliases = [tuple(alias) for alias in ptr_table_aliases]
+        self.script_refs = list(script_refs)
+        self.ptr_table_refs = list(ptr_table_refs)
+
+def readGameConfigs(configsFile):
+    """
+    Reads the [config] blocks of a GAME_CONFIGS.txt file.
+
+    A "//<game>.nes" comment names the game, a "CRC32: XXXXXXXX" line (commented or not)
+    gives its checksum and a plain text line before a [config] names the section, for
+    games with more than one script.
+
+    Parameters:
+        configsFile (str): The path to the configs file.
+
+    Returns:
+        dict: A dictionary where the keys are CRC32 values (int) and the values are lists
+            of GameConfig, one per section in file order.
+    """
+    configs = {}
+    name = section = ""
+    crc32 = None
+    values = None
+
+    def add_config():
+        if values is not None and crc32 is not None:
+            configs.setdefault(crc32, []).append(GameConfig(**values, name=name, section=section, crc32=crc32))
+
+    with open(configsFile, "r", encoding='UTF-8') as f:
+        for line in f:
+            line = line.strip()
+            crc_match = re.search(r'CRC32:\s*([0-9A-Fa-f]{8})', line)
+            if crc_match:
+                add_config()
+                values = None
+                crc32 = int(crc_match.group(1), 16)
+                section = ""
+            elif line.startswith("//"):
+                if line.lower().endswith(".nes"):
+                    add_config()
+                    values = None
+                    name = line.lstrip("/ ")
+                    crc32 = None
+            elif line == "[config]":
+                add_config()
+                values = {}
+            elif "=" in line and values is not None:
+                key, value = line.split("=", 1)
+                values[key.strip()] = ast.literal_eval(value.strip())
+            elif line:
+                add_config()
+                values = None
+                section = line
+    add_config()
+    return configs
+
+_game_configs_cache = {}
+
+def load_game_configs(configsFile):
+    """
+    Returns the profile index of a configs file, reading it only when the file changed.
+    """
+    path = os.path.abspath(configsFile)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _game_configs_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    configs = readGameConfigs(configsFile)
+    _game_configs_cache[path] = (mtime, configs)
+    return configs
+
+_rom_crc_cache = {}
+
+def get_rom_crc32(romFile):
+    """
+    Computes the CRC32 of a ROM file in one streaming pass.
+
+    Parameters:
+        romFile (str): The path to the ROM file.
+
+    Returns:
+        tuple: The CRC32 of the whole file and the CRC32 without the 16 bytes iNES
+            header (the same value if the file has no header). Cached by (path, size, mtime).
+    """
+    path = os.path.abspath(romFile)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key in _rom_crc_cache:
+        return _rom_crc_cache[key]
+    with open(path, "rb") as f:
+        header = f.read(16)
+        crc_file = zlib.crc32(header)
+        crc_data = 0 if header[:4] == b"NES\x1a" else crc_file
+        for chunk in iter(lambda: f.read(0x10000), b""):
+            crc_file = zlib.crc32(chunk, crc_file)
+            crc_data = zlib.crc32(chunk, crc_data)
+    _rom_crc_cache[key] = (crc_file, crc_data)
+    return crc_file, crc_data
+
+# Config values a <romFile>.profile may override, set when a block is relocated
+PROFILE_OVERRIDES = ("script_offset", "script_size", "ptr_table_offset", "ptr_table_size")
+
+def read_rom_profile(romFile):
+    """
+    Reads the <romFile>.profile file: the CRC32 of the original ROM on the first line,
+    then a [n] block for every section with relocated blocks.
+
+    Returns:
+        tuple: The CRC32 (int, None if there is no profile) and a dictionary mapping
+            each section number (starting at 1) to its overridden values.
+    """
+    try:
+        with open(f"{romFile}.profile", "r", encoding='UTF-8') as f:
+            lines = [line.strip() for line in f]
+        crc32 = int(lines[0], 16)
+    except (OSError, ValueError, IndexError):
+        return None, {}
+    overrides = {}
+    values = None
+    for line in lines[1:]:
+        if line.startswith("[") and line.endswith("]"):
+            values = overrides.setdefault(int(line[1:-1]), {})
+        elif "=" in line and values is not None:
+            key, value = line.split("=", 1)
+            if key.strip() in PROFILE_OVERRIDES:
+                values[key.strip()] = ast.literal_eval(value.strip())
+    return crc32, overrides
+
+def write_rom_profile(romFile, crc32, overrides=None):
+    """
+    Writes the <romFile>.profile file read by read_rom_profile.
+    """
+    with open(f"{romFile}.profile", "w", encoding='UTF-8') as f:
+        f.write(f"{crc32:08X}\n")
+        for section, values in sorted((overrides or {}).items()):
+            f.write(f"[{section}]\n")
+            for key, value in values.items():
+                f.write(f"{key} = {hex(value)}\n")
+
+def save_rom_profile(romFile, configs):
+    """
+    Remembers the CRC32 of the game and the blocks of configs that differ from
+    GAME_CONFIGS.txt in <romFile>.profile. Called once an insert is saved to the ROM,
+    the sections not in configs keep the blocks already in the profile.
+
+    Parameters:
+        romFile (str): The path to the ROM file.
+        configs (list): The GameConfig of the sections inserted, all of the same game.
+
+    Returns:
+        bool: False if the configs are not from GAME_CONFIGS.txt, nothing is saved then.
+    """
+    if not configs or configs[0].crc32 is None:
+        return False
+    crc32 = configs[0].crc32
+    originals = load_game_configs(GAME_CONFIGS_FILE).get(crc32, [])
+    remembered, overrides = read_rom_profile(romFile)
+    if remembered != crc32:
+        overrides = {}
+    for config in configs:
+        section = next((i for i, original in enumerate(originals, 1) if original.section == config.section), None)
+        if section is None:
+            continue
+        original = originals[section - 1]
+        changed = {key: getattr(config, key) for key in PROFILE_OVERRIDES
+                   if getattr(config, key) != getattr(original, key)}
+        if changed:
+            overrides[section] = changed
+        else:
+            overrides.pop(section, None)
+    write_rom_profile(romFile, crc32, overrides)
+    return True
+
+def find_game_configs(romFile, configsFile):
+    """
+    Finds the configs of a ROM in a configs file by its CRC32.
+
+    Once edited the ROM no longer has its original CRC32, so inserts remember the
+    matching CRC32 in a <romFile>.profile file (see save_rom_profile), used when the ROM
+    itself is not found, with the blocks relocated in that ROM. Nothing is written here.
+
+    Parameters:
+        romFile (str): The path to the ROM file.
+        configsFile (str): The path to the configs file.
+
+    Returns:
+        list: A copy of the GameConfig of every section of the game, or None if the ROM is unknown.
+    """
+    if not os.path.exists(configsFile):
+        return None
+    configs = load_game_configs(configsFile)
+    remembered, overrides = read_rom_profile(romFile)
+    for crc32 in get_rom_crc32(romFile):
+        if crc32 in configs:
+            # A clean ROM, any relocation in the profile belongs to an older edit
+            return [copy.copy(config) for config in configs[crc32]]
+    if remembered not in configs:
+        return None
+    game_configs = [copy.copy(config) for config in configs[remembered]]
+    for section, values in overrides.items():
+        if 1 <= section <= len(game_configs):
+            for key, value in values.items():
+                setattr(game_configs[section - 1], key, value)
+    return game_configs
+
+def get_section_file(file, index, count):
+    """
+    Returns the script file of a section, adding the section number for multi-section games
+    (script.bin -> script1.bin, script2.bin).
+    """
+    if count <= 1:
+        return file
+    root, ext = os.path.splitext(file)
+    return f"{root}{index + 1}{ext}"
+
+###STATS
+class PipelineStats:
+    """
+    Wall time of every pipeline stage, and optionally its peak memory, plus the counters
+    of the codec.
+
+    Attributes:
+        name (str): The game and section the stats belong to.
+        trace_memory (bool): Trace the peak memory of every stage. Tracing slows down
+            every allocation, so the times are then marked "traced": True.
+        stages (dict): Maps a stage name to {"seconds": float}, plus "peak_memory" (int,
+            bytes) and "traced" when tracing memory.
+        counters (dict): Codec counters, see get_compression_stats.
+    """
+    def __init__(self, name="", trace_memory=False):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measures the code run inside the with block as one stage. Tracing is stopped
+        afterwards if this stage started it, it slows down every allocation.
+        """
+        if not self.trace_memory:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.stages[name] = {"seconds": time.perf_counter() - start}
+            return
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - memory_start
+            if started:
+                tracemalloc.stop()
+            self.stages[name] = {"seconds": elapsed, "peak_memory": max(peak, 0), "traced": True}
+
+    def to_dict(self):
+        """
+        Returns the stats as a JSON serializable dictionary.
+        """
+        return {"name": self.name, "stages": self.stages, "counters": self.counters}
+
+def pipeline_stage(stats, name):
+    """
+    Returns stats.stage(name), or a context that does nothing when stats is None.
+    """
+    return stats.stage(name) if stats is not None else nullcontext()
 
 ###EXTRACT
+class RomImage:
+    """
+    A ROM file loaded once in memory.
+
+    Reads are memoryview slices of the image, writes are staged in memory and saved
+    with commit(), which replaces the ROM through a temp file so it is never half written.
+
+    Attributes:
+        path (str): The path to the ROM file.
+        data (bytearray): The ROM contents, with the staged writes.
+        dirty (list): The (start, end) ranges written since the last commit.
+    """
+    def __init__(self, romFile):
+        self.path = romFile
+        with open(romFile, "rb") as f:
+            self.data = bytearray(f.read())
+        self.dirty = []
+
+    def read(self, addr, size):
+        """
+        Returns a zero-copy view of a portion of the ROM.
+        """
+        return memoryview(self.data)[addr:addr + size]
+
+    def write(self, addr, data):
+        """
+        Stages a write to the ROM.
+        """
+        end = addr + len(data)
+        if end > len(self.data):
+            raise ValueError(f"Write to {hex(addr)}-{hex(end)} is past the end of the ROM.")
+        self.data[addr:end] = data
+        self.dirty.append((addr, end))
+
+    def commit(self, journal=None):
+        """
+        Saves the staged writes to the ROM file in one atomic replace.
+
+        Parameters:
+            journal (dict): Details of the insert, to append the bytes it overwrites to
+                the <romFile>.journal so it can be rolled back. None to not journal.
+        """
+        if not self.dirty:
+            return
+        if journal is not None:
+            append_rom_journal(self.path, self.dirty, self.data, journal)
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, temp_file = tempfile.mkstemp(prefix=name, suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.data)
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.copymode(self.path, temp_file)
+            os.replace(temp_file, self.path)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+        self.dirty = []
+
+    def discard(self):
+        """
+        Drops the staged writes, restoring the image from the ROM file.
+        """
+        if not self.dirty:
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for start, end in self.dirty:
+            self.data[start:end] = data[start:end]
+        self.dirty = []
+
 def read_rom(romFile, addr, size):
     """
     Reads a portion of a ROM file.
 
     Parameters:
-        romFile (str): The path to the ROM file.
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image.
         addr (int): The address in the ROM to start reading from.
         size (int): The number of bytes to read from the ROM.
 
     Returns:
-        bytes: A byte object containing the data read from the ROM.
+        bytes: A byte object containing the data read from the ROM (a memoryview for a RomImage).
     """
+    if isinstance(romFile, RomImage):
+        return romFile.read(addr, size)
     with open(romFile, "rb") as f:
         f.seek(addr)
         data = f.read(size)
@@ -51,37 +443,147 @@ def readTbl(tblFile):
                     continue 
     return charTable
 
-def get_translated_char(byte_value):
+class CharTable:
+    """
+    A .tbl file parsed once into lookup structures.
+
+    Attributes:
+        path (str): The path to the .tbl file.
+        forward (list): 256 entries mapping a byte value to its string (None if undefined).
+        reverse (dict): Maps a string to the first byte value defined for it.
+        trie (dict): Prefix tree over the reverse strings, used for longest-match encoding.
+    """
+    def __init__(self, tblFile):
+        self.path = tblFile
+        self.forward = [None] * 256
+        self.reverse = {}
+        self.trie = {}
+        for hexValue, chars in readTbl(tblFile).items():
+            if hexValue < 256:
+                self.forward[hexValue] = chars
+            if chars and chars not in self.reverse:
+                self.reverse[chars] = hexValue
+                node = self.trie
+                for char in chars:
+                    node = node.setdefault(char, {})
+                node[None] = hexValue
+
+    def get_char(self, byte_value):
+        """
+        Returns the string for a byte value, or the ~XX~ placeholder if it is not defined.
+        """
+        chars = self.forward[byte_value]
+        if chars is None:
+            return f"~{byte_value:02X}~"
+        return chars
+
+    def encode(self, line):
+        """
+        Converts a line of text into byte values in a single pass.
+
+        The longest tbl string matching at each position wins, ~XX~ escapes become the raw
+        byte XX, and characters not in the table fall back to their code point.
+
+        Parameters:
+            line (str): The text to encode.
+
+        Returns:
+            bytes: The byte values.
+
+        Raises:
+            ValueError: If a character is not in the table and is not a single byte.
+        """
+        byte_values = bytearray()
+        trie = self.trie
+        length = len(line)
+        i = 0
+        while i < length:
+            char = line[i]
+            if (char == "~" and i + 3 < length and line[i + 3] == "~"
+                    and line[i + 1] in _HEX_DIGITS and line[i + 2] in _HEX_DIGITS):
+                byte_values.append(int(line[i + 1:i + 3], 16))
+                i += 4
+                continue
+            node = trie
+            match_value = None
+            match_end = i
+            j = i
+            while j < length:
+                node = node.get(line[j])
+                if node is None:
+                    break
+                j += 1
+                if None in node:
+                    match_value = node[None]
+                    match_end = j
+            if match_value is None:
+                if ord(char) > 0xFF:
+                    raise ValueError(f"ERROR: {char!r} is not in {self.path}.")
+                byte_values.append(ord(char))
+                i += 1
+            else:
+                byte_values.append(match_value)
+                i = match_end
+        return bytes(byte_values)
+
+_HEX_DIGITS = frozenset("0123456789ABCDEFabcdef")
+
+_char_table_cache = {}
+
+def load_tbl(tblFile):
     """
-    Retrieves the translated character for a given byte value based on the character table.
+    Returns the CharTable for a .tbl file, parsing it only when the file changed.
 
     Parameters:
-        byte_value (int): The byte value to look up in the character table.
+        tblFile (str): The path to the .tbl file.
 
     Returns:
-        str: The translated character or a placeholder string if not found.
+        CharTable: The parsed character table, cached by (path, mtime).
     """
-    char_table = readTbl(tbl_file)
-    if byte_value in char_table:
-        return char_table[byte_value]
-    else:
-        return f"~{byte_value:02X}~"
+    path = os.path.abspath(tblFile)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _char_table_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    char_table = CharTable(tblFile)
+    _char_table_cache[path] = (mtime, char_table)
+    return char_table
 
-def get_charmaps(romFile, addr, size):
+def get_charmaps(romFile, addr, size, char_table):
     """
     Retrieves the character maps from the ROM file, dividing it into three sections: 
     charmap0, charmap1, and charmap2.
 
     Parameters:
-        romFile (str): The path to the ROM file.
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image.
         addr (int): The starting address of the character maps in the ROM.
         size (int): The size of the character maps section.
+        char_table (CharTable): The parsed character table.
 
     Returns:
         list: A list containing three sublists of translated characters (alpha0, alpha1, alpha2).
+
+    Raises:
+        ValueError: If size exceeds every charmap layout.
     """
     data = read_rom(romFile, addr, size)
+    charmaps = split_charmap(data, size, char_table)
+    if charmaps is None:
+        raise ValueError("Charmap max size exceeded")
+    return charmaps
+
+def split_charmap(data, size, char_table):
+    """
+    Divides the bytes of a charmap block into the charmaps of its layout and translates them.
+
+    Parameters:
+        data (bytes): The charmap block.
+        size (int): The size of the block, it chooses the layout.
+        char_table (CharTable): The parsed character table.
 
+    Returns:
+        tuple: The translated charmaps and the nybble divisions, or None if size exceeds every layout.
+    """
     charmap0_max_size = charmap1_max_size = charmap2_max_size = charmap3_max_size = 0
 
     if size <= 0xF:
@@ -103,8 +605,7 @@ def get_charmaps(romFile, addr, size):
         charmap3_max_size = 16
         nybbles_division = [0xC,0xD,0xE,0xF]
     else:
-        print("Charmap max size exceeded")
-        exit()
+        return None
 
     # Divide chars
     charmap0 = data[:charmap0_max_size]
@@ -119,351 +620,1048 @@ def get_charmaps(romFile, addr, size):
     charmap3 = remaining_data[:charmap3_max_size]
 
     # Decode chars to using tbl
-    alpha0 = [get_translated_char(byte) for byte in charmap0]
-    alpha1 = [get_translated_char(byte) for byte in charmap1]
-    alpha2 = [get_translated_char(byte) for byte in charmap2]
-    alpha3 = [get_translated_char(byte) for byte in charmap3]
+    alpha0 = [char_table.get_char(byte) for byte in charmap0]
+    alpha1 = [char_table.get_char(byte) for byte in charmap1]
+    alpha2 = [char_table.get_char(byte) for byte in charmap2]
+    alpha3 = [char_table.get_char(byte) for byte in charmap3]
 
     alphabets = [alpha0, alpha1, alpha2, alpha3]
     return alphabets, nybbles_division
 
-def hex_to_nybbles(hex_data):
+class GolombCodec:
     """
-    Converts a list of bytes (hex data) into a list of nybbles (4-bit nibbles).
-    
+    The Golomb 4 bits code of one charmap, built once and reused for every line.
+
+    Chars of the first charmap are one nybble, their index. The others are the flag
+    nybble of their charmap followed by their index. A code is kept as a number, the
+    index or flag << 4 | index, so both directions are flat 256-entry tables.
+
+    Attributes:
+        alphabets (list): The charmaps, of byte values to encode or of strings to decode.
+        max_index (int): The highest nybble read from the first charmap.
+        flags (dict): Maps a flag nybble to its charmap number.
+        symbols (list): 256 entries mapping a code to its symbol (None if unused).
+        codes (array): 256 entries mapping a byte value to its code (byte alphabets only).
+        nybbles (array): 256 entries mapping a byte value to its code length in nybbles,
+            0 when the byte is not in the charmaps (byte alphabets only).
+    """
+    def __init__(self, alphabets, nybbles_division=None):
+        """
+        Parameters:
+            alphabets (list): The charmaps, as returned by create_charmap or get_charmaps.
+            nybbles_division (list): The divisions returned by get_charmaps. By default the
+                ones written by insert_script: the flag of charmap k is len(alphabets[0]) + k - 1,
+                capped at 0xF.
+        """
+        if nybbles_division is None:
+            nybbles_division = [len(alphabets[0]) - 1] + [min(len(alphabets[0]) + k - 1, 0xF) for k in (1, 2, 3)]
+        self.alphabets = alphabets
+        self.max_index = nybbles_division[0]
+        self.flags = {}
+        for tier in (1, 2, 3):
+            if self.max_index < nybbles_division[tier] <= 0xF:
+                self.flags.setdefault(nybbles_division[tier], tier)
+        self._tier_flags = tier_flags = {tier: flag for flag, tier in self.flags.items()}
+
+        self.symbols = [None] * 256
+        self.codes = array('B', bytes(256))
+        self.nybbles = array('B', bytes(256))
+        self._hex_codes = [None] * 256
+        for tier, alphabet in enumerate(alphabets):
+            if tier == 0:
+                prefix, length = 0, 1
+                alphabet = alphabet[:min(self.max_index + 1, 16)]
+            elif tier in tier_flags:
+                prefix, length = tier_flags[tier] << 4, 2
+                alphabet = alphabet[:16]
+            else:
+                continue
+            for index, symbol in enumerate(alphabet):
+                code = prefix | index
+                self.symbols[code] = symbol
+                if isinstance(symbol, int):
+                    self.codes[symbol] = code
+                    self.nybbles[symbol] = length
+                    self._hex_codes[symbol] = f"{code:0{length}X}"
+
+    def line_nybbles(self, line):
+        """
+        Returns the number of nybbles of an encoded line, without the padding.
+        """
+        return sum(map(self.nybbles.__getitem__, line))
+
+    def line_hex(self, line):
+        """
+        Returns the codes of an encoded line as hex digits, padded with a 0 nybble to a whole byte.
+
+        Raises:
+            ValueError: If a byte value is not in the charmaps.
+        """
+        try:
+            line_hex = ''.join(map(self._hex_codes.__getitem__, line))
+        except TypeError:
+            missing = sorted({byte for byte in line if self._hex_codes[byte] is None})
+            raise ValueError(f"ERROR: {', '.join(f'{byte:02X}' for byte in missing)} not in the charmap.") from None
+        return line_hex + "0" if len(line_hex) % 2 else line_hex
+
+    def compress(self, text_list):
+        """
+        Packs a list of encoded lines, every line starts on a byte boundary.
+
+        Returns:
+            tuple:
+                - bytearray: The compressed script.
+                - int: The size of the compressed script.
+                - list: The cumulative byte length at the end of each line.
+        """
+        lines_hex = [self.line_hex(line) for line in text_list]
+        new_script = bytearray.fromhex(''.join(lines_hex))
+        return new_script, len(new_script), list(accumulate(len(line_hex) // 2 for line_hex in lines_hex))
+
+    def decode_prefix(self, data, line_breaker=None):
+        """
+        Decodes data nybble by nybble until its end or the first nybble that can not be decoded.
+
+        Parameters:
+            data (bytes): The compressed bytes.
+            line_breaker: The line break symbol, to report where lines end.
+
+        Returns:
+            tuple: The decoded symbols (list) and the offset of the byte after each line break (list).
+        """
+        symbols = []
+        line_ends = []
+        state = 0
+        for offset, byte in enumerate(data, 1):
+            for nybble in (byte >> 4, byte & 0x0F):
+                if state:
+                    code = self._tier_flags[state] << 4 | nybble
+                    state = 0
+                elif nybble <= self.max_index:
+                    code = nybble
+                elif nybble in self.flags:
+                    state = self.flags[nybble]
+                    continue
+                else:
+                    return symbols, line_ends
+                symbol = self.symbols[code]
+                if symbol is None:
+                    return symbols, line_ends
+                symbols.append(symbol)
+                if symbol == line_breaker:
+                    line_ends.append(offset)
+        return symbols, line_ends
+
+    def decode_table(self, line_breaker):
+        """
+        Precomputes the decoder as a byte-level state machine.
+
+        The state is the charmap whose index nybble is still pending (0 when none).
+        For every state and byte value the table holds the decoded text, split at each
+        line break, the next state and a stop code (0 continue, 1 end of data, 2 invalid nybble).
+
+        Parameters:
+            line_breaker (str): The line break symbol.
+
+        Returns:
+            list: Four lists of 256 (segments, next_state, stop) tuples.
+        """
+        tier_flags = self._tier_flags
+        symbols = self.symbols
+        table = []
+        for state in range(4):
+            if state and state not in tier_flags:
+                # Charmap without flag, this state is never reached
+                table.append(table[0])
+                continue
+            entries = []
+            for byte in range(256):
+                next_state = state
+                stop = 0
+                segments = [[]]
+                for nybble in (byte >> 4, byte & 0x0F):
+                    if next_state:
+                        code = tier_flags[next_state] << 4 | nybble
+                        next_state = 0
+                    elif nybble <= self.max_index:
+                        code = nybble
+                    elif nybble in self.flags:
+                        next_state = self.flags[nybble]
+                        continue
+                    else:
+                        stop = 2
+                        break
+                    symbol = symbols[code]
+                    if symbol is None:
+                        stop = 1
+                        break
+                    segments[-1].append(symbol)
+                    if symbol == line_breaker:
+                        segments.append([])
+                entries.append((tuple(''.join(segment) for segment in segments), next_state, stop))
+            table.append(entries)
+        return table
+
+def build_decode_table(charmap, charmapsize, line_breaker):
+    """
+    Precomputes the Golomb decoder of a charmap read from the ROM, see GolombCodec.decode_table.
+
     Parameters:
-        hex_data (list): A list of bytes (each byte is 8 bits).
+        charmap (list): A list of character maps (each containing a sublist of characters).
+        charmapsize (list): The nybble divisions returned by get_charmaps.
+        line_breaker (str): The translated line break character.
 
     Returns:
-        list: A list of nybbles (4-bit values).
+        list: Four lists of 256 (segments, next_state, stop) tuples.
+    """
+    return GolombCodec(charmap, charmapsize).decode_table(line_breaker)
+
+def iter_golomb_lines(compressed_data, decode_table, start=0):
+    """
+    Decodes Golomb compressed bytes line by line.
+
+    Parameters:
+        compressed_data (bytes): The compressed script data.
+        decode_table (list): The table returned by build_decode_table.
+        start (int): The byte offset to start decoding from.
+
+    Yields:
+        tuple: The decoded line (ending with the line break) and the offset of the byte after it.
     """
-    compressed_nybbles = []
-    for byte in hex_data:
-        compressed_nybbles.append(byte >> 4)
-        compressed_nybbles.append(byte & 0x0F)
-    return compressed_nybbles
+    state = 0
+    parts = []
+    for offset, byte in enumerate(memoryview(compressed_data)[start:], start):
+        segments, state, stop = decode_table[state][byte]
+        if stop == 2:
+            raise ValueError(f"Invalid nybble in byte {byte:02X} at offset {hex(offset)}")
+        if len(segments) == 1:
+            parts.append(segments[0])
+        else:
+            parts.append(segments[0])
+            yield ''.join(parts), offset + 1
+            for segment in segments[1:-1]:
+                yield segment, offset + 1
+            parts = [segments[-1]]
+        if stop:
+            break
 
-def decompress_golomb(compressed_data, charmap, charmapsize, line_breaker):
+def decompress_golomb(compressed_data, charmap, charmapsize, line_breaker, char_table):
     """
     Decompresses the data using Golomb coding, translating the nybbles into characters 
     based on the character maps.
 
     Parameters:
-        compressed_data (list): A list of nybbles representing the compressed data.
+        compressed_data (bytes): The compressed script data as read from the ROM.
         charmap (list): A list of character maps (each containing a sublist of characters).
+        charmapsize (list): The nybble divisions returned by get_charmaps.
         line_breaker (int): The byte value used to signify a line break.
+        char_table (CharTable): The parsed character table.
 
     Returns:
         list: A list of decompressed strings, where each string is a line of text.
     """
-    line_breaker = get_translated_char(line_breaker)  
-    decompressed_text = []
-    line = []
-    i = 0
-    while i < len(compressed_data):
-        nybble = compressed_data[i]
-         
-        # 4 bits characters
-        if nybble <= charmapsize[0]:
-            if nybble > len(charmap[0]) - 1:
-                break
-            char = charmap[0][nybble]
-            if char == line_breaker:
-                line.append(line_breaker)            
-                decompressed_text.append(''.join(line))
-                line = []  
-            else:
-                line.append(char)
-            i += 1
-        
-        # 8 bits characters #1
-        elif nybble == charmapsize[1]:
-            if i + 1 < len(compressed_data):
-                expanded_index = compressed_data[i + 1]
-                if expanded_index > len(charmap[1]) - 1:
-                    break
-                char = charmap[1][expanded_index]
-                if char == line_breaker:
-                    line.append(line_breaker)
-                    decompressed_text.append(''.join(line))
-                    line = []
-                else:
-                    line.append(char)
-                i += 2
-            else:
-                break
-        
-        # 8 bits characters #2
-        elif nybble == charmapsize[2]:
-            if i + 1 < len(compressed_data):
-                expanded_index = compressed_data[i + 1]
-                if expanded_index > len(charmap[2]) - 1:
-                    break
-                char = charmap[2][expanded_index]
-                if char == line_breaker:
-                    line.append(line_breaker)
-                    decompressed_text.append(''.join(line))
-                    line = []
-                else:
-                    line.append(char)
-                i += 2
-            else:
-                break
-            
-        # 8 bits characters #3
-        elif nybble == charmapsize[3]:
-            if i + 1 < len(compressed_data):
-                expanded_index = compressed_data[i + 1]
-                if expanded_index > len(charmap[3]) - 1:
-                    break
-                char = charmap[3][expanded_index]
-                if char == line_breaker:
-                    line.append(line_breaker)
-                    decompressed_text.append(''.join(line))
-                    line = []
-                else:
-                    line.append(char)
-                i += 2
-            else:
-                break
-        else:
-            last_nybble = compressed_data[i - 1]
-            post_nybble = compressed_data[i + 1]
-            raise ValueError(f"Invalid nybble value: {nybble}, debbug secuence: {last_nybble} {nybble} {post_nybble}")
-            break
-        
-    return decompressed_text
+    decode_table = build_decode_table(charmap, charmapsize, char_table.get_char(line_breaker))
+    return [line for line, _ in iter_golomb_lines(compressed_data, decode_table)]
 
-def writeOutFile(file, scriptText):
+def writeOutFile(file, scriptText, index=False):
     """
     Writes decompressed text to an output file, with each line formatted with a semicolon 
     and newline.
 
     Parameters:
         file (str): The path to the output file.
-        scriptText (list): A list of strings representing the script content.
+        scriptText (iterable): The strings representing the script content, may be a generator.
+        index (bool): Also write the <file>.idx message index.
     """
-    with open(file, "w", encoding='UTF-8') as f:
-        i = 0
-        for line in scriptText:
-            f.write(f"@{i+1}\n")
-            f.write(f";{line}\n")
-            f.write(f"{line}\n")
-            f.write("|\n")
-            i += 1
-            
-###INSERT
-def readScriptFile(file):
+    with open(file, "w", encoding='UTF-8', buffering=0x10000) as f:
+        f.writelines(f"@{i}\n;{line}\n{line}\n|\n" for i, line in enumerate(scriptText, 1))
+    if index:
+        build_script_index(file)
+
+###SCRIPT INDEX
+def build_script_index(file):
     """
-    Reads a file with a game's text.
-    
+    Builds the <file>.idx index of a script file: the byte offset and length of the
+    text of every @id message, so one message can be read or replaced without parsing
+    the whole file.
+
     Parameters:
-        file (str): The path to the file to read.
-    
+        file (str): The path to the script file.
+
     Returns:
-        tuple: Containing:
-            - textData (list of str): A list of strings, each representing a line of text from the file.
+        dict: A dictionary mapping each message id (str) to its (offset, length).
     """
-    with open(file, "r", encoding='utf-8') as f:
-        script = []
-        for line in f.readlines():
-            line = line.rstrip("\n")  
-            if line.startswith(";") or line.startswith("@") or line.startswith("|"):
-                continue
-            script.append(line)
-    return script
+    messages = {}
+    offset = 0
+    count = 0
+    message_id = None
+    with open(file, "rb") as f:
+        for raw_line in f:
+            line = raw_line.rstrip(b"\r\n")
+            if line.startswith(b"@"):
+                message_id = line[1:].decode('utf-8').strip()
+            elif not (line.startswith(b";") or line.startswith(b"|")):
+                count += 1
+                messages[message_id if message_id is not None else str(count)] = (offset, len(line))
+                message_id = None
+            offset += len(raw_line)
+    save_script_index(file, messages)
+    return messages
 
-def encode_chars_and_give_frecuency(script, tbl_file):
+def save_script_index(file, messages):
     """
-    Converts a list of text into hexadecimal values using the tbl dictionary,
-    and also creates a frequency histogram of the characters.
-    
-    Parameters:
-        script (list): List of strings.
-        tbl_file (str): .tbl file containing the character table.
-    
-    Returns:
-        tuple: 
-            - A list of list.
-            - A dictionary with the frequencies of the characters.
+    Writes the <file>.idx index, stamped with the size and mtime of the script file.
     """
-    char_table = readTbl(tbl_file)
-    lines = []
-    freq_counter = Counter()
-    hex_format = r'~([0-9A-Fa-f]{2})~'
-    
-    for line in script:
-        byte_values = []
-        matches = re.findall(hex_format, line)     
-        for match in matches:
-            hex_value = int(match, 16)
-            line = line.replace(f"~{match}~", chr(hex_value))
-
-        for char in line:
-            if char in char_table.values():
-                hex_value = [k for k, v in char_table.items() if v == char][0]
-                byte_values.append(hex_value)
-                freq_counter[hex_value] += 1
-            else:
-                byte_value = ord(char)
-                byte_values.append(byte_value)
-                freq_counter[byte_value] += 1
+    stat = os.stat(file)
+    with open(f"{file}.idx", "w", encoding='utf-8') as f:
+        json.dump({"size": stat.st_size, "mtime": stat.st_mtime_ns, "messages": messages}, f)
 
-        lines.append(byte_values)
+def load_script_index(file):
+    """
+    Returns the index of a script file, building it again if the file changed.
 
-    sorted_histogram = dict(sorted(freq_counter.items(), key=lambda x: (-x[1], x[0])))
+    Parameters:
+        file (str): The path to the script file.
 
-    return lines, sorted_histogram
+    Returns:
+        dict: A dictionary mapping each message id (str) to its (offset, length).
+    """
+    try:
+        with open(f"{file}.idx", "r", encoding='utf-8') as f:
+            index = json.load(f)
+        stat = os.stat(file)
+        if index["size"] == stat.st_size and index["mtime"] == stat.st_mtime_ns:
+            return {message_id: tuple(entry) for message_id, entry in index["messages"].items()}
+    except (OSError, ValueError, KeyError):
+        pass
+    return build_script_index(file)
 
-def create_charmap(frequency_chars):
+def read_script_message(file, message_id):
     """
-    Converts a list of text into hexadecimal values using the tbl dictionary,
-    and also creates a frequency histogram of the characters.
-    
+    Reads the text of one message of a script file through its index.
+
     Parameters:
-        frequency_chars (dict): A dictionary with the frequencies of the characters.
-    
-    Returns:
-        tuple: 
-            - A list of hexadecimal values (as integers).
-            - A dictionary with the frequencies of the characters.
-    """  
-    charmap0_size = 0
-    
-    if len(frequency_chars) <= 0xF:
-        charmap0_size = 16
-    elif 0xF < len(frequency_chars) <= 0x1F:
-        charmap0_size = 15
-    elif 0x1F < len(frequency_chars) <= 0x2E:
-        charmap0_size = 14
-    elif 0x2E < len(frequency_chars) <= 0x3D:
-        charmap0_size = 13
-    else:
-        print("Charmap max size exceeded")
-        exit()
+        file (str): The path to the script file.
+        message_id (int or str): The id after the @ of the message.
 
-    charmap1_size = 16
-    charmap2_size = 16
-    charmap3_size = 16
-    
-    alphabet0 = list(frequency_chars.keys())[:charmap0_size]
-    alphabet1 = list(frequency_chars.keys())[charmap0_size:charmap0_size + charmap1_size]
-    alphabet2 = list(frequency_chars.keys())[charmap0_size + charmap1_size:charmap0_size + charmap1_size + charmap2_size]
-    alphabet3 = list(frequency_chars.keys())[charmap0_size + charmap1_size + charmap2_size:charmap0_size + charmap1_size + charmap2_size + charmap3_size]
-    alphabets = [alphabet0, alphabet1, alphabet2, alphabet3]
-    
-    new_charmap = bytearray()
-    for hex_value in frequency_chars.keys():
-        new_charmap.append(hex_value)
+    Returns:
+        str: The text of the message.
+    """
+    offset, length = load_script_index(file)[str(message_id)]
+    with open(file, "rb") as f:
+        f.seek(offset)
+        return f.read(length).decode('utf-8')
 
-    new_charmap_size = len(new_charmap)
+def replace_script_message(file, message_id, text):
+    """
+    Replaces the text of one message of a script file through its index. The ";" line
+    keeps the original text.
 
-    return alphabets, new_charmap, new_charmap_size
+    Parameters:
+        file (str): The path to the script file.
+        message_id (int or str): The id after the @ of the message.
+        text (str): The new text, in a single line.
+    """
+    if "\n" in text or "\r" in text:
+        raise ValueError("A message must be a single line.")
+    messages = load_script_index(file)
+    offset, length = messages[str(message_id)]
+    data = text.encode('utf-8')
+    with open(file, "r+b") as f:
+        if len(data) == length:
+            f.seek(offset)
+            f.write(data)
+        else:
+            f.seek(offset + length)
+            tail = f.read()
+            f.seek(offset)
+            f.write(data)
+            f.write(tail)
+            f.truncate()
+    shift = len(data) - length
+    messages[str(message_id)] = (offset, len(data))
+    if shift:
+        for key, (entry_offset, entry_length) in messages.items():
+            if entry_offset > offset:
+                messages[key] = (entry_offset + shift, entry_length)
+    save_script_index(file, messages)
 
-def compress_to_nybbles(text_list, alphabets):
+def parse_ptr_table(data, ptr_table_aliases=()):
     """
-    Converts a bytearray of text (in hexadecimal values) into nybbles using a character map.
-    
-    Parameters:
-        text_list (list): A list of list.
-        alphabets (list): A list containing three sublists, each representing a charmap.
-    
-    Returns:
-        list: A list of nybbles representing the compressed text.
-    """
-
-    if len(alphabets[0]) == 13:
-        flag_0 = 0xD
-        flag_1 = 0xE
-        flag_2 = 0xF
-    elif len(alphabets[0]) == 14:
-        flag_0 = 0xE
-        flag_1 = 0xF
-        flag_2 = 0xF
-    elif len(alphabets[0]) == 15:
-        flag_0 = 0xF
-        flag_1 = 0xF
-        flag_2 = 0xF
-    elif len(alphabets[0]) == 16:
-        flag_0 = 0xF
-        flag_1 = 0xF
-        flag_2 = 0xF
-
-    nybbles = []
-    buffer = []
-    cumulative_lenghts = []
-    distance = 0
-    
-    all_chars = {}
-    for i, alphabet in enumerate(alphabets):
-        for j, char in enumerate(alphabet):
-            all_chars[char] = (i, j)
+    Parses a pointer table made by create_ptr_table.
 
-    for line in text_list:
-        for byte in line:
-            i, j = all_chars[byte]
-            if i == 0:
-                buffer.append(j)
-                distance += 4
-            elif i == 1:
-                buffer.append(flag_0)
-                buffer.append(j)
-                distance += 8
-            elif i == 2:
-                buffer.append(flag_1)
-                buffer.append(j)
-                distance +=8
-            elif i == 3:
-                buffer.append(flag_2)
-                buffer.append(j)
-                distance +=8
-        if len(buffer) % 2 != 0:
-            buffer.append(0)
-            nybbles.extend(buffer)
-            buffer = []
-            distance += 4
-        else:
-            nybbles.extend(buffer)
-            buffer = []      
-        cumulative_lenghts.append(distance)
+    Each 2 bytes little-endian pointer is the offset, from the script start, where a
+    message ends, that is where the next one starts. 0x0000 entries are section
+    separators, zeros at the end are free space.
 
-    cumulative_lenghts = [length // 8 for length in cumulative_lenghts]
-        
-    return nybbles, cumulative_lenghts
+    Parameters:
+        data (bytes): The pointer table block.
+        ptr_table_aliases (list): The (from, to) slots of the game config, the "to" slots are skipped.
+
+    Returns:
+        list: The end offset of each message, in message order.
+    """
+    alias_slots = {to for _, to in ptr_table_aliases}
+    pointers = [data[i] | (data[i + 1] << 8) for i in range(0, len(data) - 1, 2)]
+    return [pointer for slot, pointer in enumerate(pointers) if pointer != 0 and slot not in alias_slots]
 
-def nybbles_to_hex(nybbles):
+def read_messages(romFile, message_ids, script_offset, ptr_table_offset, ptr_table_size, charmap, charmapsize, line_breaker, char_table, ptr_table_aliases=()):
     """
-    Converts a list of nybbles into a bytearray and returns the bytearray size.
+    Decodes only the requested messages, seeking to them through the pointer table.
 
     Parameters:
-        nybbles (list): List of nybbles (4-bit values).
-    
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image.
+        message_ids (list): The message numbers to decode, starting at 1 like the script file.
+        script_offset (int): The address of the script in the ROM.
+        ptr_table_offset (int): The address of the pointer table in the ROM.
+        ptr_table_size (int): The size of the pointer table.
+        charmap (list): A list of character maps, as returned by get_charmaps.
+        charmapsize (list): The nybble divisions returned by get_charmaps.
+        line_breaker (int): The byte value used to signify a line break.
+        char_table (CharTable): The parsed character table.
+        ptr_table_aliases (list): The (from, to) pointer slots of the game config.
+
     Returns:
-        tuple: 
-            - bytearray: The corresponding bytearray of the nybbles.
-            - int: The size of the bytearray.
+        dict: A dictionary mapping each message id to its text.
     """
-    byte_values = bytearray()
+    message_ends = parse_ptr_table(read_rom(romFile, ptr_table_offset, ptr_table_size), ptr_table_aliases)
+    script_end = max(message_ends, default=0)
+    decode_table = build_decode_table(charmap, charmapsize, char_table.get_char(line_breaker))
+    messages = {}
+    for message_id in message_ids:
+        if not 1 <= message_id <= len(message_ends):
+            raise ValueError(f"Message {message_id} is not in the pointer table ({len(message_ends)} messages).")
+        # Pooled messages may share data, so decode up to the line break, not to the next pointer
+        start = message_ends[message_id - 2] if message_id > 1 else 0
+        data = read_rom(romFile, script_offset + start, max(script_end - start, 0))
+        messages[message_id] = next(iter_golomb_lines(data, decode_table), ("", 0))[0]
+    return messages
 
-    for i in range(0, len(nybbles), 2):
-        nybble_pair = (nybbles[i] << 4) | nybbles[i + 1]
-        byte_values.append(nybble_pair)
+def check_ptr_table(message_ends, compressed_data, charmap, charmapsize, line_breaker, char_table, dedup_messages=False):
+    """
+    Compares the pointer table against the line breaks found by the sequential decoder.
 
-    return byte_values, len(byte_values)
+    With pooled messages the pointers are not in script order, so each one only has to
+    land on a line break.
 
-def create_ptr_table(line_lenghts, messages_counts):
+    Parameters:
+        message_ends (list): The end offsets returned by parse_ptr_table.
+        compressed_data (bytes): The script block.
+        charmap (list): A list of character maps, as returned by get_charmaps.
+        charmapsize (list): The nybble divisions returned by get_charmaps.
+        line_breaker (int): The byte value used to signify a line break.
+        char_table (CharTable): The parsed character table.
+        dedup_messages (bool): True if the script was inserted with pooled messages.
+
+    Returns:
+        list: (message id, pointer end, decoded end) for every message that disagrees.
     """
-    Creates the pointer table from line lengths and the blocks defined by messages_counts.
-    Each value is converted to hexadecimal and represented in little-endian format.
+    decode_table = build_decode_table(charmap, charmapsize, char_table.get_char(line_breaker))
+    line_ends = [end for _, end in iter_golomb_lines(compressed_data, decode_table)]
+    line_breaks = set(line_ends)
+    mismatches = []
+    for i, pointer in enumerate(message_ends):
+        decoded = line_ends[i] if i < len(line_ends) else None
+        if dedup_messages:
+            if pointer not in line_breaks:
+                mismatches.append((i + 1, pointer, decoded))
+        elif pointer != decoded:
+            mismatches.append((i + 1, pointer, decoded))
+    return mismatches
+
+def verify_script(script, romFile, char_table, config):
+    """
+    Decodes the charmap, script and pointer table blocks in memory, following the
+    pointers, and compares every message with the script. Nothing is written.
 
     Parameters:
-        line_lengths (list): List of line lengths.
-        messages_counts (list): List of the number of lines per block.
+        script (list): The lines of the script file.
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image.
+        char_table (CharTable): The parsed character table.
+        config (GameConfig): The location of the text blocks.
 
     Returns:
-        list: List of pointers (in little-endian format) separating the blocks.
+        list: (message id, reason) for every message that does not match, in message order.
     """
-    table_pointers = bytearray()
+    compressed_data = read_rom(romFile, config.script_offset, config.script_size)
+    charmap, charmaps_size = get_charmaps(romFile, config.charmap_offset, config.charmap_size, char_table)
+    message_ends = parse_ptr_table(read_rom(romFile, config.ptr_table_offset, config.ptr_table_size),
+                                   config.ptr_table_aliases)
+    decode_table = build_decode_table(charmap, charmaps_size, char_table.get_char(config.line_breaker))
+
+    mismatches = []
+    start = 0
+    for i, (line, end) in enumerate(zip(script, message_ends)):
+        if not start < len(compressed_data) or (not config.dedup_messages and not start < end <= len(compressed_data)):
+            mismatches.append((i + 1, f"pointer {hex(end)} is outside the message (starts at {hex(start)})."))
+            start = end
+            continue
+        try:
+            decoded, decoded_end = next(iter_golomb_lines(compressed_data, decode_table, start), ("", None))
+        except ValueError as e:
+            mismatches.append((i + 1, str(e)))
+        else:
+            # Pooled messages end where the shared data ends, not at their own pointer
+            if decoded_end != end and not (config.dedup_messages and decoded_end is not None):
+                found = hex(decoded_end) if decoded_end is not None else "none"
+                mismatches.append((i + 1, f"pointer ends at {hex(end)}, decoded line ends at {found}."))
+            elif decoded != line and char_table.encode(decoded) != char_table.encode(line):
+                mismatches.append((i + 1, f"decoded {decoded!r}, script has {line!r}."))
+        start = end
+    if len(message_ends) != len(script):
+        mismatches.append((min(len(message_ends), len(script)) + 1,
+                           f"{len(message_ends)} pointers in the ROM, {len(script)} lines in the script."))
+    return mismatches
+
+def parse_message_ids(text):
+    """
+    Parses a list of message ids such as "1,4,10-12".
+
+    Parameters:
+        text (str): Comma separated ids or ranges.
+
+    Returns:
+        list: The message ids (int).
+    """
+    message_ids = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-", 1)
+            message_ids.extend(range(int(first), int(last) + 1))
+        else:
+            message_ids.append(int(part))
+    return message_ids
+
+def extract_script(romFile, out_file, char_table, config, stats=None, cache_dir=None, index=False):
+    """
+    Decodes the script of a game and writes it to a script file.
+
+    Parameters:
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image.
+        out_file (str): The path to the output file.
+        char_table (CharTable): The parsed character table.
+        config (GameConfig): The location of the text blocks.
+        stats (PipelineStats): Receives the stage timings and the message sizes, optional.
+        cache_dir (str): The extraction cache directory, the script is only decoded if
+            its blocks, config or table are not cached yet. None to always decode.
+        index (bool): Also write the <out_file>.idx message index, see build_script_index.
+
+    Returns:
+        list: The character maps read from the ROM.
+    """
+    # Read rom file script
+    with pipeline_stage(stats, "read_rom"):
+        compressed_data = read_rom(romFile, config.script_offset, config.script_size)
+    # Read rom file charmap
+    with pipeline_stage(stats, "get_charmaps"):
+        charmap, charmaps_size = get_charmaps(romFile, config.charmap_offset, config.charmap_size, char_table)
+    ptr_table_data = read_rom(romFile, config.ptr_table_offset, config.ptr_table_size)
+
+    # A script already decoded from the same blocks is only written again
+    cached = None
+    if cache_dir is not None:
+        with pipeline_stage(stats, "extract_cache"):
+            cache_key = get_extract_cache_key(read_rom(romFile, config.charmap_offset, config.charmap_size),
+                                              compressed_data, ptr_table_data, config, char_table)
+            cached = load_extract_cache(cache_dir, cache_key)
+    if cached is not None:
+        lines, line_ends = cached
+        with pipeline_stage(stats, "write"):
+            writeOutFile(out_file, lines, index)
+    else:
+        # Convert hex data to raw text, streamed to the bin file
+        lines = []
+        line_ends = []
+        def decoded_lines():
+            for line, end in iter_golomb_lines(compressed_data, decode_table):
+                line_ends.append(end)
+                yield line
+        def pooled_lines():
+            # Pooled messages are not stored in order, decode every one from its pointer
+            message_ends = parse_ptr_table(ptr_table_data, config.ptr_table_aliases)
+            for start in [0] + message_ends[:-1]:
+                line, end = next(iter_golomb_lines(compressed_data, decode_table, start), ("", start))
+                line_ends.append(end)
+                yield line
+        def kept_lines(decoded):
+            for line in decoded:
+                lines.append(line)
+                yield line
+        with pipeline_stage(stats, "decode_and_write"):
+            decode_table = build_decode_table(charmap, charmaps_size, char_table.get_char(config.line_breaker))
+            decoded = pooled_lines() if config.dedup_messages else decoded_lines()
+            writeOutFile(out_file, kept_lines(decoded) if cache_dir is not None else decoded, index)
+        if cache_dir is not None:
+            with pipeline_stage(stats, "extract_cache"):
+                save_extract_cache(cache_dir, cache_key, lines, line_ends)
+    if stats is not None:
+        if cache_dir is not None:
+            stats.counters["extract_cache"] = "hit" if cached is not None else "miss"
+        stats.counters["messages"] = len(line_ends)
+        stats.counters["message_bytes"] = [end - start for start, end in zip([0] + line_ends, line_ends)]
+    return charmap
+
+###EXTRACT CACHE
+EXTRACT_CACHE_MAGIC = b"GLC1"
+EXTRACT_CACHE_MAX_SIZE = 64 * 1024 * 1024 # Bytes kept in the cache directory, least recently used go first
+
+def get_extract_cache_key(charmap_data, script_data, ptr_table_data, config, char_table):
+    """
+    Returns the key of a decoded script in the extraction cache: a hash of the charmap,
+    script and pointer table blocks, the config values that change how they are decoded,
+    and the table. The rest of the ROM does not matter, so an insert in another section
+    or a patch elsewhere keeps the entry.
+    """
+    key = hashlib.sha1()
+    for data in (charmap_data, script_data, ptr_table_data):
+        key.update(len(data).to_bytes(4, "little"))
+        key.update(data)
+    key.update(repr((config.script_offset, config.charmap_offset, config.ptr_table_offset, config.line_breaker,
+                     config.dedup_messages, list(config.ptr_table_aliases))).encode('utf-8'))
+    key.update(get_tbl_signature(char_table).encode('utf-8'))
+    return key.hexdigest()
+
+def load_extract_cache(cache_dir, key):
+    """
+    Loads a decoded script from the extraction cache and marks it as recently used.
+
+    Returns:
+        tuple: The lines (list) and the line ends (list), or None if missing or damaged.
+    """
+    path = os.path.join(cache_dir, f"{key}.bin")
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != EXTRACT_CACHE_MAGIC:
+            return None
+        count = int.from_bytes(data[4:8], "little")
+        line_ends = array('I')
+        line_ends.frombytes(data[8:8 + count * line_ends.itemsize])
+        if sys.byteorder == "big":
+            line_ends.byteswap()
+        text = zlib.decompress(data[8 + count * line_ends.itemsize:]).decode('utf-8')
+        os.utime(path)
+    except (OSError, ValueError, zlib.error):
+        return None
+    lines = text.split("\n") if count else []
+    if len(lines) != count:
+        return None
+    return lines, line_ends.tolist()
+
+def save_extract_cache(cache_dir, key, lines, line_ends, max_size=EXTRACT_CACHE_MAX_SIZE):
+    """
+    Saves a decoded script in the extraction cache: the line ends as 32-bit words and
+    the text zlib compressed. The least recently used entries are removed while the
+    cache is bigger than max_size.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    ends = array('I', line_ends)
+    if sys.byteorder == "big":
+        ends.byteswap()
+    data = EXTRACT_CACHE_MAGIC + len(lines).to_bytes(4, "little") + ends.tobytes() + \
+        zlib.compress("\n".join(lines).encode('utf-8'), 9)
+    # Written aside and renamed, batch jobs share the directory
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, os.path.join(cache_dir, f"{key}.bin"))
+    prune_extract_cache(cache_dir, max_size)
+
+def prune_extract_cache(cache_dir, max_size=EXTRACT_CACHE_MAX_SIZE):
+    """
+    Removes the least recently used entries of the extraction cache until it fits in max_size.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".bin"):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+###INSERT
+def iter_script(file):
+    """
+    Reads a file with a game's text one message at a time.
+
+    Parameters:
+        file (str): The path to the file to read.
+
+    Yields:
+        tuple: The message id (the text after @, or the position if missing) and the message text.
+    """
+    with open(file, "r", encoding='utf-8') as f:
+        count = 0
+        message_id = None
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("@"):
+                message_id = line[1:].strip()
+            elif not (line.startswith(";") or line.startswith("|")):
+                count += 1
+                yield (message_id if message_id is not None else str(count)), line
+                message_id = None
+
+def readScriptFile(file):
+    """
+    Reads a file with a game's text.
+
+    When every message has a numeric @id and the ids are 1 to the number of messages,
+    the messages are returned in id order, so moving a message block in the file does
+    not change the pointer it is inserted at. Otherwise the file order is kept.
+    
+    Parameters:
+        file (str): The path to the file to read.
+    
+    Returns:
+        tuple: Containing:
+            - textData (list of str): A list of strings, each representing a line of text from the file.
+    """
+    messages = list(iter_script(file))
+    ids = [message_id for message_id, _ in messages]
+    if all(message_id.isdigit() for message_id in ids) and sorted(map(int, ids)) == list(range(1, len(ids) + 1)):
+        messages.sort(key=lambda message: int(message[0]))
+    return [line for _, line in messages]
+
+def encode_chars_and_give_frecuency(script, char_table):
+    """
+    Converts a list of text into hexadecimal values using the tbl dictionary,
+    and also creates a frequency histogram of the characters.
+    
+    Parameters:
+        script (list): List of strings.
+        char_table (CharTable): The parsed character table.
+    
+    Returns:
+        tuple: 
+            - A list of list.
+            - A dictionary with the frequencies of the characters.
+    """
+    lines = [char_table.encode(line) for line in script]
+    return lines, get_frecuency_table(lines)
+
+def get_frecuency_table(lines):
+    """
+    Creates the frequency histogram of the encoded characters.
+
+    Parameters:
+        lines (list): A list of list of byte values.
+
+    Returns:
+        dict: The frequencies of the characters, most frequent first.
+    """
+    freq_counter = Counter()
+    for byte_values in lines:
+        freq_counter.update(byte_values)
+    return dict(sorted(freq_counter.items(), key=lambda x: (-x[1], x[0])))
+
+# Size of the first charmap -> max number of chars the layout can hold
+CHARMAP_LAYOUTS = {16: 0xF, 15: 0x1F, 14: 0x2E, 13: 0x3D}
+
+def get_charmap0_size(size):
+    """
+    Returns the size of the first charmap for a charmap of the given size.
+
+    This is the same layout get_charmaps uses to read the charmap block back.
+
+    Parameters:
+        size (int): The number of chars (or the charmap block size).
+
+    Returns:
+        int: 16, 15, 14 or 13, or None if the size exceeds every layout.
+    """
+    for charmap0_size, max_chars in CHARMAP_LAYOUTS.items():
+        if size <= max_chars:
+            return charmap0_size
+    return None
+
+def create_charmap(frequency_chars):
+    """
+    Converts a list of text into hexadecimal values using the tbl dictionary,
+    and also creates a frequency histogram of the characters.
+    
+    Parameters:
+        frequency_chars (dict): A dictionary with the frequencies of the characters.
+    
+    Returns:
+        tuple: 
+            - A list of hexadecimal values (as integers).
+            - A dictionary with the frequencies of the characters.
+
+    Raises:
+        ValueError: If there are more chars than the biggest charmap layout holds.
+    """  
+    charmap0_size = get_charmap0_size(len(frequency_chars))
+    
+    if charmap0_size is None:
+        raise ValueError("Charmap max size exceeded")
+
+    charmap1_size = 16
+    charmap2_size = 16
+    charmap3_size = 16
+    
+    alphabet0 = list(frequency_chars.keys())[:charmap0_size]
+    alphabet1 = list(frequency_chars.keys())[charmap0_size:charmap0_size + charmap1_size]
+    alphabet2 = list(frequency_chars.keys())[charmap0_size + charmap1_size:charmap0_size + charmap1_size + charmap2_size]
+    alphabet3 = list(frequency_chars.keys())[charmap0_size + charmap1_size + charmap2_size:charmap0_size + charmap1_size + charmap2_size + charmap3_size]
+    alphabets = [alphabet0, alphabet1, alphabet2, alphabet3]
+    
+    new_charmap = bytearray()
+    for hex_value in frequency_chars.keys():
+        new_charmap.append(hex_value)
+
+    new_charmap_size = len(new_charmap)
+
+    return alphabets, new_charmap, new_charmap_size
+
+def get_script_size(text_list, alphabet0):
+    """
+    Computes the exact compressed size of a script, including the padding of odd lines.
+
+    Parameters:
+        text_list (list): A list of list of byte values.
+        alphabet0 (list): The chars coded with 4 bits, every other char costs 8 bits.
+
+    Returns:
+        int: The size in bytes of the compressed script.
+    """
+    alphabet0 = set(alphabet0)
+    size = 0
+    for line in text_list:
+        nybbles = 2 * len(line) - sum(1 for byte in line if byte in alphabet0)
+        size += (nybbles + 1) // 2
+    return size
+
+def optimize_charmap(text_list, frequency_chars, charmap0_sizes=None):
+    """
+    Chooses the charmap layout and 4 bits chars that give the smallest script.
+
+    For every legal size of the first charmap the greedy assignment (most frequent chars
+    first) is refined by swapping 4 bits and 8 bits chars while the exact size, counting
+    the padding nybble of odd lines, gets smaller.
+
+    Parameters:
+        text_list (list): A list of list of byte values.
+        frequency_chars (dict): A dictionary with the frequencies of the characters.
+        charmap0_sizes (list): The sizes of the first charmap to try, all layouts by default.
+
+    Returns:
+        tuple:
+            - list: The charmaps, as returned by create_charmap.
+            - bytearray: The raw charmap to write in the ROM.
+            - int: The size of the raw charmap.
+            - int: The script size with the greedy assignment, with the layout of create_charmap
+              when it is one of charmap0_sizes, else with the first of charmap0_sizes.
+            - int: The script size with the chosen layout.
+    """
+    chars = list(frequency_chars.keys())
+    greedy_alphabets, greedy_charmap, greedy_charmap_size = create_charmap(frequency_chars)
+    if charmap0_sizes is None:
+        charmap0_sizes = list(CHARMAP_LAYOUTS)
+    charmap0_sizes = [size for size in charmap0_sizes if len(chars) <= CHARMAP_LAYOUTS[size]]
+    if not charmap0_sizes:
+        greedy_size = get_script_size(text_list, greedy_alphabets[0])
+        return greedy_alphabets, greedy_charmap, greedy_charmap_size, greedy_size, greedy_size
+    # Compare with the greedy charmap of a layout that is tried, so the saving is never negative
+    greedy_charmap0_size = get_charmap0_size(len(chars))
+    if greedy_charmap0_size not in charmap0_sizes:
+        greedy_charmap0_size = charmap0_sizes[0]
+    greedy_size = get_script_size(text_list, chars[:greedy_charmap0_size])
+
+    # Occurrences of every char per line
+    line_counts = [Counter(line) for line in text_list]
+    occurrences = {char: [] for char in chars}
+    for i, counts in enumerate(line_counts):
+        for char, count in counts.items():
+            occurrences[char].append((i, count))
+
+    best = None
+    for charmap0_size in charmap0_sizes:
+        alphabet0 = set(chars[:charmap0_size])
+        nybbles = [2 * len(line) - sum(count for char, count in counts.items() if char in alphabet0)
+                   for line, counts in zip(text_list, line_counts)]
+        size = sum((n + 1) // 2 for n in nybbles)
+
+        while True:
+            best_swap = None
+            best_delta = 0
+            for char_out in alphabet0:
+                for char_in in chars:
+                    if char_in in alphabet0:
+                        continue
+                    # Each line saves at most half a byte more than its nybbles
+                    lines = len(occurrences[char_out]) + len(occurrences[char_in])
+                    if frequency_chars[char_out] - frequency_chars[char_in] >= lines:
+                        continue
+                    changes = {}
+                    for i, count in occurrences[char_out]:
+                        changes[i] = changes.get(i, 0) + count
+                    for i, count in occurrences[char_in]:
+                        changes[i] = changes.get(i, 0) - count
+                    delta = sum((nybbles[i] + d + 1) // 2 - (nybbles[i] + 1) // 2 for i, d in changes.items())
+                    if delta < best_delta:
+                        best_delta = delta
+                        best_swap = (char_out, char_in, changes)
+            if best_swap is None:
+                break
+            char_out, char_in, changes = best_swap
+            alphabet0.remove(char_out)
+            alphabet0.add(char_in)
+            for i, d in changes.items():
+                nybbles[i] += d
+            size += best_delta
+
+        if best is None or size < best[1]:
+            best = (charmap0_size, size, alphabet0)
+
+    charmap0_size, size, alphabet0 = best
+    others = [char for char in chars if char not in alphabet0]
+    alphabets = [[char for char in chars if char in alphabet0]]
+    for i in range(3):
+        alphabets.append(others[16 * i:16 * (i + 1)])
+    new_charmap = bytearray(char for alphabet in alphabets for char in alphabet)
+
+    return alphabets, new_charmap, len(new_charmap), greedy_size, size
+
+def compress_script(text_list, alphabets):
+    """
+    Compresses the encoded script into Golomb packed bytes.
+
+    Each line is padded with a 0 nybble when it has an odd number of nybbles, so every
+    line starts on a byte boundary.
+
+    Parameters:
+        text_list (list): A list of encoded lines (bytes).
+        alphabets (list): A list containing the charmaps returned by create_charmap.
+
+    Returns:
+        tuple:
+            - bytearray: The compressed script.
+            - int: The size of the compressed script.
+            - list: The cumulative byte length at the end of each line.
+    """
+    return GolombCodec(alphabets).compress(text_list)
+
+def get_compression_stats(text_list, alphabets):
+    """
+    Counts how the codec compresses a script.
+
+    Parameters:
+        text_list (list): A list of list of byte values.
+        alphabets (list): A list containing the charmaps returned by create_charmap.
+
+    Returns:
+        dict: Containing:
+            - symbols_4bit (int): Chars coded with one nybble.
+            - symbols_8bit (int): Chars coded with a flag and an index nybble.
+            - flag_nybbles (dict): Flag nybbles emitted for each charmap ("charmap1".."charmap3").
+            - padding_nybbles (list): The padding nybble (0 or 1) added at the end of each line.
+            - padding_bytes (int): The space used by all the padding, in whole bytes (rounded up).
+            - message_bytes (list): The compressed size of each line.
+    """
+    charmap_of = {char: i for i, alphabet in enumerate(alphabets) for char in alphabet}
+    flags = [0, 0, 0, 0]
+    padding_nybbles = []
+    message_bytes = []
+    for line in text_list:
+        line_flags = Counter(charmap_of[byte] for byte in line)
+        for i, count in line_flags.items():
+            flags[i] += count
+        nybbles = len(line) + len(line) - line_flags[0]
+        padding_nybbles.append(nybbles % 2)
+        message_bytes.append((nybbles + 1) // 2)
+    return {
+        "symbols_4bit": flags[0],
+        "symbols_8bit": flags[1] + flags[2] + flags[3],
+        "flag_nybbles": {f"charmap{i}": flags[i] for i in range(1, 4)},
+        "padding_nybbles": padding_nybbles,
+        "padding_bytes": (sum(padding_nybbles) + 1) // 2,
+        "message_bytes": message_bytes,
+    }
+
+def pool_messages(packed_lines, messages_counts, dedup=True):
+    """
+    Joins the compressed messages, storing identical messages once when dedup is True.
+
+    A pooled message points to the first copy. The first message of every pointer
+    block is always stored, and nothing points to offset 0, which the pointer table
+    uses as separator.
+
+    Parameters:
+        packed_lines (list): The compressed bytes of each message.
+        messages_counts (list): List of the number of lines per block.
+        dedup (bool): False to store every message, in order.
+
+    Returns:
+        tuple:
+            - bytes: The script block.
+            - list: The pointer of each message, the offset where the next message starts
+              and the end of the script for the last one, as create_ptr_table expects.
+            - int: The number of pooled messages.
+    """
+    block_starts = {0, *accumulate(messages_counts)}
+    stored = {}
+    script = bytearray()
+    starts = []
+    pooled = 0
+    for i, line in enumerate(packed_lines):
+        start = stored.get(line) if dedup and i not in block_starts else None
+        if start:
+            pooled += 1
+        else:
+            start = len(script)
+            script += line
+            if not stored.get(line):
+                stored[line] = start
+        starts.append(start)
+    return bytes(script), starts[1:] + [len(script)], pooled
+
+def apply_ptr_table_aliases(table_pointers, ptr_table_aliases):
+    """
+    Copies pointer slots as listed in the game config, each slot is 2 bytes.
+
+    Parameters:
+        table_pointers (bytearray): The table returned by create_ptr_table.
+        ptr_table_aliases (list): The (from, to) slots.
+
+    Returns:
+        tuple: The pointer table and its size.
+    """
+    for source, target in ptr_table_aliases:
+        if len(table_pointers) < target * 2 + 2:
+            table_pointers.extend(bytes(target * 2 + 2 - len(table_pointers)))
+        table_pointers[target * 2:target * 2 + 2] = table_pointers[source * 2:source * 2 + 2]
+    return table_pointers, len(table_pointers)
+
+def create_ptr_table(line_lenghts, messages_counts):
+    """
+    Creates the pointer table from line lengths and the blocks defined by messages_counts.
+    Each value is converted to hexadecimal and represented in little-endian format.
+
+    Parameters:
+        line_lengths (list): List of line lengths.
+        messages_counts (list): List of the number of lines per block.
+
+    Returns:
+        list: List of pointers (in little-endian format) separating the blocks.
+    """
+    table_pointers = bytearray()
     index = 0
     
     for block_size_index, block_size in enumerate(messages_counts):
@@ -499,7 +1697,7 @@ def writeROM(romFile, startOffset, originalSize, data):
     Writes data to the ROM at the specified offset.
 
     Parameters:
-        romFile (str): The path to the ROM file.
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image.
         startOffset (int): The offset in the ROM file where data should be written.
         originalSize (int): The original size of the data to ensure there is enough space for the write operation.
         data (bytes or bytearray): The data to write to the ROM.
@@ -513,103 +1711,1735 @@ def writeROM(romFile, startOffset, originalSize, data):
     # Fill free space
     filledData = data + b'\x00' * freeSpace
         
+    if isinstance(romFile, RomImage):
+        romFile.write(startOffset, filledData)
+        return freeSpace
     with open(romFile, "r+b") as f: 
         f.seek(startOffset)
         f.write(filledData)
     return freeSpace
     
-if __name__ == "__main__":
-    if len(sys.argv) < 5:
-        sys.stdout.write("Usage: -d <romFile> <outFile> <tblFile>\n")
-        sys.stdout.write("       -c <outFile> <romFile> <tblFile>\n")
-        sys.stdout.write("       -h show help.\n")
-        sys.stdout.write("       -v show version.\n")
-        sys.exit(1)
-    
-    # Option
-    option = sys.argv[1]
-    ##CONFIG############################################
-    ##EDIT HERE#########################################
-    script_offset = 0x1185
-    script_size = 0xC01
-    charmap_offset = 0x114F
-    charmap_size = 0x36
-    ptr_table_offset = 0x1D88
-    ptr_table_size = 0x68
-    ptr_table_sections = [24,25]
-    line_breaker = 0x00
-    ####################################################
-    
-    # Decompress
-    if option == '-d' and len(sys.argv) == 5:
-        rom_file = sys.argv[2]
-        out_file = sys.argv[3]
-        tbl_file = sys.argv[4]
-        
-        # Read rom file script
-        compressed_data = read_rom(rom_file, script_offset, script_size)
-        # Read rom file charmap
-        charmap, charmaps_size = get_charmaps(rom_file, charmap_offset, charmap_size)
-        # Convert hex data to nybbles
-        compressed_nybbles = hex_to_nybbles(compressed_data)
-        # Convert nybbles to raw text
-        decompressed_text = decompress_golomb(compressed_nybbles, charmap, charmaps_size, line_breaker)
-        # Export to bin file
-        writeOutFile(out_file, decompressed_text)
-        print("------- CHAR MAPS -------\n")
-        print(charmap)
-        print(f"CHARMAP BLOCK SIZE: {charmap_size} / {hex(charmap_size)} bytes.")
-        print(f"TEXT BLOCK SIZE: {script_size} / {hex(script_size)} bytes.")
-        print(f"PTR_TABLE BLOCK SIZE: {ptr_table_size} / {hex(ptr_table_size)} bytes.")
-        print(f"Text extracted to {out_file}")
-        print("Decoding complete.\n")
-        
-    # Compress
-    elif option == '-c' and len(sys.argv) == 5:        
-        out_file = sys.argv[2]
-        rom_file = sys.argv[3]
-        tbl_file = sys.argv[4]
-
-        # Read decompressed script
-        script = readScriptFile(out_file)
-        # Encode with tbl
-        encoded_script, frecuency_table = encode_chars_and_give_frecuency(script, tbl_file)
-        # Create new charmaps
-        charmap, new_charmap_raw, new_charmap_size = create_charmap(frecuency_table)
-        # Create nybbles
-        compressed_text, lines_lenghts = compress_to_nybbles(encoded_script, charmap)
-        # Convert nybbles to hex data
-        new_script, new_script_size = nybbles_to_hex(compressed_text)
-        # Create pointers table
-        new_ptr_table, new_ptr_table_size = create_ptr_table(lines_lenghts, ptr_table_sections)
-        # Write data to ROM if pass len checks
-        if new_charmap_size > charmap_size:
-            print(f"ERROR: char map size has exceeded its maximum size. Remove {new_charmap_size - charmap_size} character type.")
-            char_values = [[chr(byte) for byte in alphabet] for alphabet in charmap]
-            print(char_values)
-            exit()
-        if new_script_size > script_size:
-            print(f"ERROR: script size has exceeded its maximum size. Remove {new_script_size - script_size} bytes.")
-            exit()
-        if new_ptr_table_size > ptr_table_size:
-            print(f"ERROR: table pointer size has exceeded its maximum size. Remove {(new_ptr_table_size - ptr_table_size)//2} lines in script.")
-            exit()
-        charmap_freespace = writeROM(rom_file, charmap_offset, charmap_size, new_charmap_raw)
-        print(f"CharMap write to address {hex(charmap_offset)}, {charmap_freespace} chars free.")
-        script_freespace = writeROM(rom_file, script_offset, script_size, new_script)
-        print(f"Script text write to address {hex(script_offset)}, {script_freespace} bytes free.")
-        ptr_table_freespace = writeROM(rom_file, ptr_table_offset, ptr_table_size, new_ptr_table)
-        print(f"Pointer table write to address {hex(ptr_table_offset)}, {ptr_table_freespace//2} lines/pointers left.")
-##        #FIX FOR BARBIE, 1 POINTER REPEATED (uncomment for Barbie)
-##        save_ptr = read_rom(rom_file, 0x1DB6, 0x02)
-##        writeROM(rom_file, 0x1DB8, 0x02, save_ptr)
-        
+def get_changed_ranges(old, new, gap=0):
+    """
+    Finds the ranges where new differs from old.
+
+    Parameters:
+        old (bytes): The original bytes, bytes past its end count as changed.
+        new (bytes): The new bytes.
+        gap (int): Changed ranges separated by this many equal bytes or less are joined.
+
+    Returns:
+        list: (start, end) of each changed range.
+    """
+    changes = []
+    i = 0
+    while i < len(new):
+        if i < len(old) and old[i] == new[i]:
+            i += 1
+            continue
+        start = i
+        while i < len(new) and (i >= len(old) or old[i] != new[i]):
+            i += 1
+        if changes and start - changes[-1][1] <= gap:
+            start = changes.pop()[0]
+        changes.append((start, i))
+    return changes
+
+def patchROM(romFile, startOffset, originalSize, data):
+    """
+    Writes data to the ROM like writeROM, but only the bytes that differ from the ROM.
+
+    Parameters:
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image.
+        startOffset (int): The offset in the ROM file where data should be written.
+        originalSize (int): The size of the block, the rest is filled with 0x00.
+        data (bytes or bytearray): The data to write to the ROM.
+
+    Returns:
+        tuple:
+            - int: The amount of free space left after writing the data.
+            - int: The number of bytes actually written.
+    """
+    freeSpace = int(originalSize) - len(data)
+    filledData = bytes(data) + b'\x00' * freeSpace
+    current = bytes(read_rom(romFile, startOffset, len(filledData)))
+
+    # Ranges that differ from the ROM
+    changes = get_changed_ranges(current, filledData)
+
+    if isinstance(romFile, RomImage):
+        for start, end in changes:
+            romFile.write(startOffset + start, filledData[start:end])
+    elif changes:
+        with open(romFile, "r+b") as f:
+            for start, end in changes:
+                f.seek(startOffset + start)
+                f.write(filledData[start:end])
+    return freeSpace, sum(end - start for start, end in changes)
+
+###INSERT CACHE
+def load_insert_cache(cache_file, char_table):
+    """
+    Loads the sidecar cache of the last incremental insert.
+
+    Parameters:
+        cache_file (str or dict): The path to the cache file, or a cache kept in memory.
+        char_table (CharTable): The parsed character table, the cache is dropped if it changed.
+
+    Returns:
+        dict: The cache, empty if missing or made with another table.
+    """
+    if isinstance(cache_file, dict):
+        cache = cache_file
+    else:
+        try:
+            with open(cache_file, "r", encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+    if cache.get("tbl") != get_tbl_signature(char_table):
+        return {}
+    return cache
+
+def get_tbl_signature(char_table):
+    """
+    Returns a hash of the table contents.
+    """
+    return hashlib.sha1(repr(sorted(char_table.reverse.items())).encode('utf-8')).hexdigest()
+
+def get_line_key(line):
+    """
+    Returns the hash used to recognise a script line in the insert cache.
+    """
+    return hashlib.sha1(line.encode('utf-8')).hexdigest()
+
+def insert_script(script, romFile, char_table, config, cache_file=None, stats=None, relocate=False, reserved=()):
+    """
+    Compresses a script and writes the charmap, script and pointer table to the ROM.
+
+    With a cache file only the lines that changed since the last insert are encoded
+    and, if the charmap did not change, packed again. Only the ROM bytes that differ
+    are written.
+
+    Parameters:
+        script (list): The script lines, as returned by readScriptFile.
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image. A path is
+            written and saved at once, an image is only staged until its commit().
+        char_table (CharTable): The parsed character table.
+        config (GameConfig): The location of the text blocks.
+        cache_file (str or dict): The path to the insert cache, a dict to keep it in memory,
+            or None for a full insert.
+        stats (PipelineStats): Receives the stage timings and the codec counters, optional.
+        relocate (bool): Move the script or the pointer table to free space in the same bank
+            when it does not fit, updating config, see relocate_block.
+        reserved (list): (start, end) ranges relocation must not use, the blocks of the other sections.
+
+    Returns:
+        tuple:
+            - int: The free space in the charmap block.
+            - int: The free space in the script block.
+            - int: The free space in the pointer table block.
+            - int: The bytes saved by the charmap optimizer.
+
+    Raises:
+        ValueError: If the script has fewer messages than the pointer table sections or a
+            block exceeds its maximum size, nothing is written.
+    """
+    messages_needed = sum(config.ptr_table_sections)
+    if len(script) < messages_needed:
+        raise ValueError(f"ERROR: the script has {len(script)} messages, the pointer table needs {messages_needed}. Add {messages_needed - len(script)} lines to the script.")
+    cache = load_insert_cache(cache_file, char_table) if cache_file is not None else {}
+    cached_lines = cache.get("lines", {})
+
+    # Encode with tbl, reusing the lines that did not change
+    with pipeline_stage(stats, "encode"):
+        line_keys = [get_line_key(line) for line in script]
+        encoded_script = []
+        for line, key in zip(script, line_keys):
+            if key in cached_lines:
+                encoded_script.append(bytes.fromhex(cached_lines[key][0]))
+            else:
+                encoded_script.append(char_table.encode(line))
+        frecuency_table = get_frecuency_table(encoded_script)
+
+    # Create new charmaps, with the layout the charmap block is read back with
+    with pipeline_stage(stats, "optimize_charmap"):
+        charmap, new_charmap_raw, new_charmap_size, greedy_script_size, optimized_script_size = optimize_charmap(
+            encoded_script, frecuency_table, [get_charmap0_size(config.charmap_size)])
+    if cache.get("charmap") != new_charmap_raw.hex():
+        cached_lines = {}
+
+    # Compress only the lines not packed with this charmap yet
+    with pipeline_stage(stats, "compress_script"):
+        missing = [i for i, key in enumerate(line_keys) if key not in cached_lines]
+        packed, _, ends = compress_script([encoded_script[i] for i in missing], charmap)
+        packed_lines = [None] * len(script)
+        start = 0
+        for i, end in zip(missing, ends):
+            packed_lines[i] = bytes(packed[start:end])
+            start = end
+        for i, key in enumerate(line_keys):
+            if packed_lines[i] is None:
+                packed_lines[i] = bytes.fromhex(cached_lines[key][1])
+        new_script, lines_lenghts, pooled_messages = pool_messages(packed_lines, config.ptr_table_sections,
+                                                                   config.dedup_messages)
+        new_script_size = len(new_script)
+
+    # Create pointers table
+    with pipeline_stage(stats, "create_ptr_table"):
+        new_ptr_table, new_ptr_table_size = create_ptr_table(lines_lenghts, config.ptr_table_sections)
+        new_ptr_table, new_ptr_table_size = apply_ptr_table_aliases(new_ptr_table, config.ptr_table_aliases)
+
+    if stats is not None:
+        stats.counters.update(get_compression_stats(encoded_script, charmap))
+        stats.counters.update(charmap_bytes=new_charmap_size, script_bytes=new_script_size,
+                              ptr_table_bytes=new_ptr_table_size, pooled_messages=pooled_messages,
+                              pooled_bytes=sum(map(len, packed_lines)) - new_script_size,
+                              charmap_optimizer_saved_bytes=greedy_script_size - optimized_script_size)
+
+    if new_charmap_size > config.charmap_size:
+        char_values = [[chr(byte) for byte in alphabet] for alphabet in charmap]
+        raise ValueError(f"ERROR: char map size has exceeded its maximum size. Remove {new_charmap_size - config.charmap_size} character type.\n{char_values}")
+    rom = romFile if isinstance(romFile, RomImage) else RomImage(romFile)
+    if relocate:
+        if new_script_size > config.script_size:
+            relocate_block(rom, config, "script", new_script_size, reserved)
+        if new_ptr_table_size > config.ptr_table_size:
+            relocate_block(rom, config, "ptr_table", new_ptr_table_size, reserved)
+    if new_script_size > config.script_size:
+        raise ValueError(f"ERROR: script size has exceeded its maximum size. Remove {new_script_size - config.script_size} bytes.")
+    if new_ptr_table_size > config.ptr_table_size:
+        raise ValueError(f"ERROR: table pointer size has exceeded its maximum size. Remove {(new_ptr_table_size - config.ptr_table_size)//2} lines in script.")
+
+    blocks = [(config.charmap_offset, config.charmap_size, new_charmap_raw),
+              (config.script_offset, config.script_size, new_script),
+              (config.ptr_table_offset, config.ptr_table_size, new_ptr_table)]
+    # Staging only copies the blocks into the ROM image, commit_rom writes the file
+    with pipeline_stage(stats, "stage_rom"):
+        if cache_file is not None:
+            free_spaces = [patchROM(rom, offset, size, data)[0] for offset, size, data in blocks]
+            cache = {"tbl": get_tbl_signature(char_table),
+                     "charmap": new_charmap_raw.hex(),
+                     "lines": {key: [bytes(encoded).hex(), packed_line.hex()]
+                               for key, encoded, packed_line in zip(line_keys, encoded_script, packed_lines)}}
+            if isinstance(cache_file, dict):
+                cache_file.clear()
+                cache_file.update(cache)
+            else:
+                with open(cache_file, "w", encoding='utf-8') as f:
+                    json.dump(cache, f)
+        else:
+            free_spaces = [writeROM(rom, offset, size, data) for offset, size, data in blocks]
+    if rom is not romFile:
+        with pipeline_stage(stats, "commit_rom"):
+            rom.commit(get_journal_entry("insert_script", [config], [(*free_spaces, 0)]))
+            save_rom_profile(romFile, [config])
+
+    return free_spaces[0], free_spaces[1], free_spaces[2], greedy_script_size - optimized_script_size
+
+###FREE SPACE
+PRG_BANK_SIZE = 0x4000
+FREE_SPACE_MIN_RUN = 32 # Shorter runs of filler bytes are likely code or data
+
+def get_prg_banks(data):
+    """
+    Splits the PRG ROM of an iNES image into 16 KB banks.
+
+    Parameters:
+        data (bytes): The ROM contents.
+
+    Returns:
+        list: (start, end) file offsets of every bank.
+    """
+    if data[:4] == b"NES\x1a":
+        start = 16 + (512 if data[6] & 0x04 else 0)
+        prg_size = data[4] * PRG_BANK_SIZE
+    else:
+        start = 0
+        prg_size = len(data)
+    end = min(start + prg_size, len(data))
+    return [(bank, min(bank + PRG_BANK_SIZE, end)) for bank in range(start, end, PRG_BANK_SIZE)]
+
+def get_bank(banks, offset):
+    """
+    Returns the number of the bank holding a file offset, or None.
+    """
+    for i, (start, end) in enumerate(banks):
+        if start <= offset < end:
+            return i
+    return None
+
+def find_free_space(romFile, min_size=FREE_SPACE_MIN_RUN, reserved=()):
+    """
+    Indexes the runs of filler bytes (0x00 or 0xFF) in every PRG bank.
+
+    Runs never cross a bank. A filled region is only a candidate: check in a debugger
+    that the game does not read it before moving a block there.
+
+    Parameters:
+        romFile (str or RomImage): The path to the ROM file, or an open ROM image.
+        min_size (int): The shortest run to report.
+        reserved (list): (start, end) ranges left out of the runs, like the blocks in use.
+
+    Returns:
+        list: (start, end, bank) of every run, in ROM order.
+    """
+    if isinstance(romFile, RomImage):
+        data = romFile.data
+    else:
+        with open(romFile, "rb") as f:
+            data = f.read()
+    pattern = re.compile(rb"\x00{%d,}|\xff{%d,}" % (min_size, min_size))
+    runs = []
+    for bank, (bank_start, bank_end) in enumerate(get_prg_banks(data)):
+        for match in pattern.finditer(data, bank_start, bank_end):
+            pieces = [match.span()]
+            for reserved_start, reserved_end in reserved:
+                pieces = [piece for start, end in pieces
+                          for piece in ((start, min(end, reserved_start)), (max(start, reserved_end), end))
+                          if piece[1] - piece[0] > 0]
+            runs.extend((start, end, bank) for start, end in pieces if end - start >= min_size)
+    return sorted(runs)
+
+def find_block_refs(romFile, offset):
+    """
+    Looks in the bank of a block for code that may load its CPU address: the address as a
+    little-endian word, or an immediate load (LDA/LDX/LDY #) of its low byte followed by
+    one of its high byte. The bank may be mapped at 0x8000 or 0xC000.
+
+    Returns:
+        list: Candidate refs, as script_refs and ptr_table_refs take them.
+    """
+    data = romFile.data if isinstance(romFile, RomImage) else read_rom(romFile, 0, os.path.getsize(romFile))
+    banks = get_prg_banks(data)
+    bank = get_bank(banks, offset)
+    if bank is None:
+        return []
+    bank_start, bank_end = banks[bank]
+    refs = []
+    for base in (0x8000, 0xC000):
+        address = base + offset - bank_start
+        low, high = address & 0xFF, address >> 8
+        word = re.compile(re.escape(bytes([low, high])))
+        refs.extend(match.start() for match in word.finditer(data, bank_start, bank_end))
+        immediate = re.compile(rb"[\xa0\xa2\xa9]" + re.escape(bytes([low])) + rb".{0,8}?[\xa0\xa2\xa9]"
+                               + re.escape(bytes([high])), re.DOTALL)
+        refs.extend((match.start() + 1, match.end() - 1) for match in immediate.finditer(data, bank_start, bank_end))
+    return refs
+
+def get_config_blocks(config):
+    """
+    Returns the (start, end) ranges of the charmap, script and pointer table of a config.
+    """
+    return [(config.charmap_offset, config.charmap_offset + config.charmap_size),
+            (config.script_offset, config.script_offset + config.script_size),
+            (config.ptr_table_offset, config.ptr_table_offset + config.ptr_table_size)]
+
+def relocate_block(rom, config, block, size, reserved=(), min_run=FREE_SPACE_MIN_RUN):
+    """
+    Makes room for a script or pointer table block that grew past its size.
+
+    The block grows in place when free space follows it. Otherwise it moves to the
+    smallest free run of its bank that fits, and the CPU addresses listed in
+    <block>_refs are moved with it; the 2 bytes pointers are relative to the script, so
+    they stay valid. config is updated with the new offset and size.
+
+    Parameters:
+        rom (RomImage): The ROM image, the refs are staged on it.
+        config (GameConfig): The config of the block.
+        block (str): "script" or "ptr_table".
+        size (int): The size the block needs.
+        reserved (list): (start, end) ranges that must not be used.
+        min_run (int): The shortest run of filler bytes taken as free space.
+
+    Returns:
+        int: The offset of the block.
+
+    Raises:
+        ValueError: If there is no room, or no refs to move the block.
+    """
+    offset = getattr(config, f"{block}_offset")
+    old_end = offset + getattr(config, f"{block}_size")
+    banks = get_prg_banks(rom.data)
+    bank = get_bank(banks, offset)
+    if bank is None:
+        raise ValueError(f"ERROR: {block} at {hex(offset)} is not in the PRG ROM.")
+    in_use = list(reserved) + get_config_blocks(config)
+    own = (offset, old_end)
+    # The writes already staged by this insert, like an earlier relocation, are not free
+    taken = [r for r in in_use if r != own] + rom.dirty
+    runs = [run for run in find_free_space(rom, min_run, taken) if run[2] == bank]
+
+    # Grow in place, over the free space right after the block
+    end = old_end
+    for start, run_end, _ in runs:
+        if start <= end < run_end:
+            end = run_end
+    if end - offset >= size:
+        setattr(config, f"{block}_size", end - offset)
+        return offset
+
+    refs = getattr(config, f"{block}_refs")
+    fits = [(end - start, start, end) for start, end, _ in runs
+            if end - start >= size and (end <= offset or start >= old_end)]
+    if not refs:
+        raise ValueError(f"ERROR: {block} needs {size} bytes and can not grow. "
+                         f"Add {block}_refs to the game config to move it, -f lists the free space.")
+    if not fits:
+        raise ValueError(f"ERROR: {block} needs {size} bytes, no free run in bank {bank} is that big.")
+    _, new_offset, new_end = min(fits)
+
+    bank_start = banks[bank][0]
+    for ref in refs:
+        low, high = ref if isinstance(ref, (tuple, list)) else (ref, ref + 1)
+        address = rom.data[low] | (rom.data[high] << 8)
+        if address & (PRG_BANK_SIZE - 1) != (offset - bank_start) & (PRG_BANK_SIZE - 1):
+            raise ValueError(f"ERROR: {block}_refs {ref} holds {hex(address)}, not the address of {hex(offset)}.")
+        address += new_offset - offset
+        rom.write(low, bytes([address & 0xFF]))
+        rom.write(high, bytes([address >> 8]))
+    setattr(config, f"{block}_offset", new_offset)
+    setattr(config, f"{block}_size", new_end - new_offset)
+    return new_offset
+
+###SCAN
+SCAN_CHARMAP_SIZES = (0x10, 0x3D) # Smallest and biggest charmap tried
+SCAN_TEXT_CHARS = frozenset(" .,!?'-\"")
+SCAN_PTR_TABLE_ENDS = 32 # First line ends a pointer table is looked for from
+SCAN_PTR_TABLE_MIN = 3 # Pointers needed to trust a table
+SCAN_CANDIDATES = 10 # Candidates decoded in full for every config returned
+
+def score_text(symbols, line_breaker):
+    """
+    Scores how much decoded symbols look like script text.
+
+    Returns:
+        float: The share of letters, spaces and punctuation, 0 for less than 2 lines.
+    """
+    lines = symbols.count(line_breaker)
+    chars = len(symbols) - lines
+    if lines < 2 or chars < 24:
+        return 0.0
+    text = sum(1 for symbol in symbols if len(symbol) == 1 and (symbol.isalpha() or symbol in SCAN_TEXT_CHARS))
+    return text / chars
+
+def scan_charmaps(romFile, tblFile, start, end, line_breaker=0x00, trial_size=512, min_score=0.3):
+    """
+    Looks for charmaps starting between start and end, each followed by a script.
+
+    A charmap is a run of distinct bytes, mostly defined in the tbl. For every size the
+    bytes right after it are trial decoded and scored with score_text, plus the pointer
+    coverage when the first line ends are also found as a pointer table: a charmap
+    shifted by one byte still decodes to letters, but not to the right line breaks.
+    Windows are rejected as early as possible, cheapest test first.
+
+    Parameters:
+        romFile (str): The path to the ROM file.
+        tblFile (str): The path to the .tbl file.
+        start (int): The first offset to try.
+        end (int): The offset after the last one to try.
+        line_breaker (int): The byte value used to signify a line break.
+        trial_size (int): The number of script bytes decoded for every candidate.
+        min_score (float): The lowest text score of a candidate with a pointer table,
+            candidates without one need twice as much.
+
+    Returns:
+        list: (score, charmap offset, charmap size) of the best size of every offset that passed.
+    """
+    char_table = load_tbl(tblFile)
+    with open(romFile, "rb") as f:
+        data = f.read()
+    defined = [char_table.forward[byte] is not None for byte in range(256)]
+    line_breaker_char = char_table.get_char(line_breaker)
+    min_size, max_size = SCAN_CHARMAP_SIZES
+
+    results = []
+    run_end = start
+    last_seen = {}
+    for offset in range(start, min(end, len(data))):
+        # Longest run of distinct bytes from offset
+        run_end = max(run_end, offset)
+        while run_end < len(data) and run_end - offset < max_size and last_seen.get(data[run_end], -1) < offset:
+            last_seen[data[run_end]] = run_end
+            run_end += 1
+        length = run_end - offset
+        if length < min_size:
+            continue
+        window = data[offset:run_end]
+        if line_breaker not in window or sum(defined[byte] for byte in window[:min_size]) < 0.8 * min_size:
+            continue
+        best = None
+        for size in range(max(min_size, window.index(line_breaker) + 1), length + 1):
+            charmap, charmaps_size = split_charmap(window[:size], size, char_table)
+            codec = GolombCodec(charmap, charmaps_size)
+            symbols, line_ends = codec.decode_prefix(data[offset + size:offset + size + trial_size], line_breaker_char)
+            score = score_text(symbols, line_breaker_char)
+            if score < min_score:
+                continue
+            table = find_ptr_table(data, line_ends)
+            if table is not None and table[1] >= 2 * SCAN_PTR_TABLE_MIN:
+                score += table[4]
+            elif score < 2 * min_score:
+                continue
+            if best is None or score > best[0]:
+                best = (score, offset, size)
+        if best is not None:
+            results.append(best)
+    return results
+
+def find_ptr_table(data, line_ends):
+    """
+    Finds the pointer table of a script: little-endian words increasing over the decoded
+    line ends, with 0x0000 separators between sections. A message can hold several line
+    breaks, so the table is looked for from any of the first line ends followed by another.
+
+    Parameters:
+        data (bytes): The ROM contents.
+        line_ends (list): The line end offsets of the sequential decoder, from the script start.
+
+    Returns:
+        tuple: (offset, size, sections, script size, coverage) of the longest table found, or None.
+            coverage is the share of the line ends up to the script size that are pointers:
+            a misaligned charmap can break lines so often that any table matches.
+    """
+    ends = set(line_ends)
+    starts = set()
+    for first in line_ends[:SCAN_PTR_TABLE_ENDS]:
+        pattern = first.to_bytes(2, "little")
+        position = data.find(pattern)
+        while position != -1:
+            second = int.from_bytes(data[position + 2:position + 4], "little")
+            if second > first and second in ends:
+                # Back to the first entry of the table
+                start = position
+                while start >= 2 and data[start - 2] | (data[start - 1] << 8) in ends and \
+                        data[start - 2] | (data[start - 1] << 8) < data[start] | (data[start + 1] << 8):
+                    start -= 2
+                starts.add(start)
+            position = data.find(pattern, position + 1)
+
+    best = None
+    for position in sorted(starts):
+        sections = []
+        count = 0
+        previous = 0
+        i = position
+        while i + 2 <= len(data):
+            value = data[i] | (data[i + 1] << 8)
+            if value == 0 and count:
+                sections.append(count)
+                count = 0
+            elif value > previous and (value in ends or int.from_bytes(data[i + 2:i + 4], "little") in ends):
+                # The sequential decoder can lose a line break after a padding nybble, and find it again
+                count += 1
+                previous = value
+            else:
+                break
+            i += 2
+        entries = sum(sections) + count
+        if best is None or entries > best[0]:
+            best = (entries, position, i - position, sections if count else sections[:-1], previous)
+    if best is None:
+        return None
+    entries, position, size, sections, script_size = best
+    return position, size, sections, script_size, entries / sum(1 for end in line_ends if end <= script_size)
+
+def scan_rom(romFile, tblFile, line_breaker=0x00, workers=None, top=5):
+    """
+    Looks for Golomb scripts in a ROM, to write the GAME_CONFIGS.txt block of a new game.
+
+    The charmap scan runs in a process pool, one window of the ROM per job. The best
+    candidates are then decoded further and matched with a pointer table, the pointer
+    coverage wins over the text score.
+
+    Parameters:
+        romFile (str): The path to the ROM file.
+        tblFile (str): The path to the .tbl file.
+        line_breaker (int): The byte value used to signify a line break.
+        workers (int): The number of worker processes, the CPU count by default.
+        top (int): The number of candidates returned.
+
+    Returns:
+        list: A GameConfig for every candidate, best first, with score and coverage attributes.
+            script_size is the last pointer, ptr_table_* are 0 when no table was found.
+    """
+    with open(romFile, "rb") as f:
+        data = f.read()
+    windows = list(range(0, len(data), PRG_BANK_SIZE))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(scan_charmaps, romFile, tblFile, start, start + PRG_BANK_SIZE, line_breaker)
+                for start in windows]
+        candidates = sorted((result for job in jobs for result in job.result()), reverse=True)
+
+    char_table = load_tbl(tblFile)
+    found = []
+    for score, charmap_offset, charmap_size in candidates[:top * SCAN_CANDIDATES]:
+        script_offset = charmap_offset + charmap_size
+        charmap, charmaps_size = split_charmap(data[charmap_offset:script_offset], charmap_size, char_table)
+        decode_table = build_decode_table(charmap, charmaps_size, char_table.get_char(line_breaker))
+        line_ends = []
+        try:
+            for _, end in iter_golomb_lines(data[script_offset:script_offset + 0x8000], decode_table):
+                line_ends.append(end)
+        except ValueError:
+            pass
+        table = find_ptr_table(data, line_ends)
+        ptr_table_offset, ptr_table_size, sections, script_size, coverage = table if table else (0, 0, [], 0, 0)
+        config = GameConfig(script_offset, script_size, charmap_offset, charmap_size, ptr_table_offset,
+                            ptr_table_size, sections, line_breaker)
+        config.score = score
+        config.coverage = coverage
+        found.append(config)
+
+    configs = []
+    for config in sorted(found, key=lambda config: (config.coverage, config.score), reverse=True):
+        # Neighbour offsets decode the same script, keep the best one
+        if any(abs(other.charmap_offset - config.charmap_offset) < SCAN_CHARMAP_SIZES[1] for other in configs):
+            continue
+        configs.append(config)
+        if len(configs) == top:
+            break
+    return configs
+
+###ANALYZE
+def analyze_script(script, char_table, config, top=10):
+    """
+    Computes the compressed size of every message under the charmap insert_script would
+    choose, from a nybble count per character instead of a full compress.
+
+    Parameters:
+        script (list): The lines of the script file.
+        char_table (CharTable): The parsed character table.
+        config (GameConfig): The location and size of the text blocks.
+        top (int): The number of messages to list.
+
+    Returns:
+        dict: Containing:
+            - script_bytes (int): The size of the compressed script.
+            - charmap_bytes (int): The size of the charmap block.
+            - lines (list): (message id, bytes, 8-bit chars, text) of the most expensive messages.
+            - escape_chars (list): (char, charmap, uses, bytes saved if every use is rewritten
+              with a 4-bit char), most saved first. The line breaker is not listed.
+    """
+    encoded_script = [char_table.encode(line) for line in script]
+    frecuency_table = get_frecuency_table(encoded_script)
+    charmap, _, charmap_bytes, _, _ = optimize_charmap(
+        encoded_script, frecuency_table, [get_charmap0_size(config.charmap_size)])
+
+    codec = GolombCodec(charmap)
+    line_nybbles = [codec.line_nybbles(line) for line in encoded_script]
+    line_bytes = [(nybbles + 1) // 2 for nybbles in line_nybbles]
+    if config.dedup_messages:
+        block_starts = {0, *accumulate(config.ptr_table_sections)}
+        stored = set()
+        for i, line in enumerate(encoded_script):
+            key = bytes(line)
+            if key in stored and i not in block_starts:
+                line_bytes[i] = 0
+            stored.add(key)
+
+    escape_chars = []
+    for tier, alphabet in enumerate(charmap[1:], 1):
+        for byte in alphabet:
+            if byte == config.line_breaker:
+                continue
+            saved = 0
+            for i, line in enumerate(encoded_script):
+                uses = line.count(byte)
+                if uses and line_bytes[i]:
+                    saved += line_bytes[i] - (line_nybbles[i] - uses + 1) // 2
+            escape_chars.append((char_table.get_char(byte), tier, frecuency_table[byte], saved))
+    escape_chars.sort(key=lambda x: -x[3])
+
+    expensive = sorted(range(len(script)), key=lambda i: -line_bytes[i])[:top]
+    return {
+        "script_bytes": sum(line_bytes),
+        "charmap_bytes": charmap_bytes,
+        "lines": [(i + 1, line_bytes[i], line_nybbles[i] - len(encoded_script[i]), script[i]) for i in expensive],
+        "escape_chars": escape_chars,
+    }
+
+###PATCH
+IPS_EOF = 0x454F46 # "EOF", a record can not start at this offset
+IPS_RLE_MIN = 8 # A run of the same byte this long is cheaper as an RLE record
+
+def write_ips_records(f, data, start, end):
+    """
+    Writes the IPS records that set data[start:end], using RLE records for long runs.
+
+    Parameters:
+        f (file): The patch file, open for binary writing.
+        data (bytes): The whole patched ROM.
+        start (int): The first byte of the range.
+        end (int): The end of the range.
+    """
+    if start == IPS_EOF:
+        start -= 1
+    i = start
+    while i < end:
+        # Run of the same byte at i
+        run = i + 1
+        while run < end and data[run] == data[i] and run - i < 0xFFFF:
+            run += 1
+        if run - i >= IPS_RLE_MIN:
+            if run == IPS_EOF and run < end:
+                run -= 1
+            f.write(i.to_bytes(3, "big") + b"\x00\x00" + (run - i).to_bytes(2, "big") + data[i:i + 1])
+            i = run
+            continue
+        # Literal bytes up to the next long run
+        j = run
+        while j < end and j - i < 0xFFFF:
+            k = j + 1
+            while k < end and data[k] == data[j] and k - j < IPS_RLE_MIN:
+                k += 1
+            if k - j >= IPS_RLE_MIN:
+                break
+            j = k
+        j = min(j, i + 0xFFFF)
+        if j == IPS_EOF and j < end:
+            j += 1 if j - i < 0xFFFF else -1
+        f.write(i.to_bytes(3, "big") + (j - i).to_bytes(2, "big") + data[i:j])
+        i = j
+
+def create_ips_patch(rom, patchFile):
+    """
+    Writes the staged writes of a ROM image as an IPS patch, leaving the ROM file untouched.
+
+    Only the dirty ranges are read back from the ROM file and compared, so the cost
+    depends on the size of the changes, not on the size of the ROM.
+
+    Parameters:
+        rom (RomImage): The ROM image with the staged writes.
+        patchFile (str): The path to the IPS file to write.
+
+    Returns:
+        int: The number of bytes changed by the patch.
+    """
+    ranges = []
+    for start, end in sorted(rom.dirty):
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(end, ranges[-1][1]))
+        else:
+            ranges.append((start, end))
+    if max((end for _, end in ranges), default=0) > 0x1000000:
+        raise ValueError("ERROR: IPS patches can not address past 16 MB.")
+
+    changed = 0
+    with open(rom.path, "rb") as original, open(patchFile, "wb") as f:
+        f.write(b"PATCH")
+        for start, end in ranges:
+            original.seek(start)
+            old = original.read(end - start)
+            # A new record costs 5 bytes, so join changes closer than that
+            for change_start, change_end in get_changed_ranges(old, rom.data[start:end], gap=5):
+                write_ips_records(f, rom.data, start + change_start, start + change_end)
+                changed += change_end - change_start
+        f.write(b"EOF")
+    return changed
+
+def apply_ips_patch(patchFile, rom):
+    """
+    Applies an IPS patch to a ROM image, as staged writes.
+
+    Parameters:
+        patchFile (str): The path to the IPS file.
+        rom (RomImage): The ROM image to patch, call commit() to save it.
+
+    Returns:
+        int: The number of records applied.
+
+    Raises:
+        ValueError: If the file is not a valid IPS patch.
+    """
+    with open(patchFile, "rb") as f:
+        patch = f.read()
+    if patch[:5] != b"PATCH":
+        raise ValueError(f"ERROR: {patchFile} is not an IPS patch.")
+    i = 5
+    records = 0
+    while patch[i:i + 3] != b"EOF":
+        if i + 5 > len(patch):
+            raise ValueError(f"ERROR: {patchFile} is truncated.")
+        offset = int.from_bytes(patch[i:i + 3], "big")
+        size = int.from_bytes(patch[i + 3:i + 5], "big")
+        i += 5
+        if size == 0:
+            if i + 3 > len(patch):
+                raise ValueError(f"ERROR: {patchFile} is truncated.")
+            data = patch[i + 2:i + 3] * int.from_bytes(patch[i:i + 2], "big")
+            i += 3
+        else:
+            data = patch[i:i + size]
+            if len(data) < size:
+                raise ValueError(f"ERROR: {patchFile} is truncated.")
+            i += size
+        if offset + len(data) > len(rom.data):
+            rom.data.extend(bytes(offset + len(data) - len(rom.data)))
+        rom.write(offset, data)
+        records += 1
+    # Optional truncation extension: 3 bytes with the new ROM size
+    if len(patch) == i + 6:
+        del rom.data[int.from_bytes(patch[i + 3:i + 6], "big"):]
+        rom.dirty.append((0, len(rom.data)))
+    return records
+
+###JOURNAL
+JOURNAL_MAGIC = b"GJR1"
+
+def get_journal_entry(source, configs, results):
+    """
+    Returns the details of an insert kept in the journal: what was inserted and the free
+    space of every section.
+
+    Parameters:
+        source (str): The script file or the tool that inserted.
+        configs (list): The GameConfig of every section inserted.
+        results (list): The insert_script result of every section.
+    """
+    return {"source": source,
+            "sections": [{"section": f"{config.name} {config.section}".strip(), "charmap_free": charmap_free,
+                          "script_free": script_free, "ptr_table_free": ptr_table_free}
+                         for config, (charmap_free, script_free, ptr_table_free, _) in zip(configs, results)]}
+
+def append_rom_journal(romFile, ranges, data, entry):
+    """
+    Appends an insert to the <romFile>.journal: the bytes of the ROM file it is about to
+    overwrite, only where they differ, and the current <romFile>.profile. The journal
+    grows with the bytes changed, not the ROM size.
+
+    A record is the magic, the size of its JSON header and of its payload (4 bytes each,
+    little-endian), the header and the original bytes of every range, one after another.
+
+    Parameters:
+        romFile (str): The path to the ROM file, not written yet.
+        ranges (list): The (start, end) ranges about to be written.
+        data (bytes): The new ROM contents.
+        entry (dict): The details of the insert, see get_journal_entry.
+
+    Returns:
+        int: The number of original bytes journaled.
+    """
+    changed = []
+    payload = bytearray()
+    covered = 0
+    with open(romFile, "rb") as f:
+        for start, end in sorted(ranges):
+            # Ranges written twice are journaled once
+            start = max(start, covered)
+            if start >= end:
+                continue
+            covered = end
+            f.seek(start)
+            original = f.read(end - start)
+            for change_start, change_end in get_changed_ranges(original, data[start:end], gap=4):
+                changed.append((start + change_start, start + change_end))
+                payload += original[change_start:change_end]
+    try:
+        with open(f"{romFile}.profile", "r", encoding='UTF-8') as f:
+            profile = f.read()
+    except OSError:
+        profile = None
+    header = json.dumps(dict(entry, time=time.time(), ranges=changed, profile=profile)).encode('utf-8')
+    with open(f"{romFile}.journal", "ab") as f:
+        f.write(JOURNAL_MAGIC + len(header).to_bytes(4, "little") + len(payload).to_bytes(4, "little"))
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(payload)
+
+def read_rom_journal(romFile):
+    """
+    Reads the record headers of the <romFile>.journal, without the original bytes.
+    A record cut by a crash at the end of the file is ignored.
+
+    Returns:
+        list: The header of every insert, oldest first, with the keys id (starting at 1),
+            offset (of the record) and payload (offset of its original bytes) added.
+    """
+    records = []
+    try:
+        f = open(f"{romFile}.journal", "rb")
+    except OSError:
+        return records
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + 12 <= size:
+            f.seek(offset)
+            head = f.read(12)
+            header_size = int.from_bytes(head[4:8], "little")
+            payload_size = int.from_bytes(head[8:12], "little")
+            if head[:4] != JOURNAL_MAGIC or offset + 12 + header_size + payload_size > size:
+                break
+            try:
+                record = json.loads(f.read(header_size).decode('utf-8'))
+            except ValueError:
+                break
+            record.update(id=len(records) + 1, offset=offset, payload=offset + 12 + header_size)
+            records.append(record)
+            offset += 12 + header_size + payload_size
+    return records
+
+def rollback_rom(romFile, insert_id=None):
+    """
+    Rolls the ROM back to how it was after an insert of the journal, restoring the bytes
+    of every later insert, newest first, and the <romFile>.profile. The later records
+    are removed from the journal.
+
+    Parameters:
+        romFile (str): The path to the ROM file.
+        insert_id (int): The insert to go back to, 0 for the ROM before the first one.
+            None undoes the last insert.
+
+    Returns:
+        int: The number of bytes restored.
+
+    Raises:
+        ValueError: If the journal has no such insert.
+    """
+    records = read_rom_journal(romFile)
+    if not records:
+        raise ValueError(f"No inserts journaled for {romFile}.")
+    if insert_id is None:
+        insert_id = len(records) - 1
+    if not 0 <= insert_id < len(records):
+        raise ValueError(f"No insert to roll back to {insert_id}, the journal has {len(records)} inserts.")
+    rom = RomImage(romFile)
+    restored = 0
+    with open(f"{romFile}.journal", "rb") as f:
+        for record in reversed(records[insert_id:]):
+            f.seek(record["payload"])
+            for start, end in record["ranges"]:
+                rom.write(start, f.read(end - start))
+                restored += end - start
+    rom.commit()
+    profile = records[insert_id]["profile"]
+    if profile is None:
+        if os.path.exists(f"{romFile}.profile"):
+            os.remove(f"{romFile}.profile")
+    else:
+        with open(f"{romFile}.profile", "w", encoding='UTF-8') as f:
+            f.write(profile)
+    # The ROM is restored first, a crash before the truncate only leaves records that restore it again
+    os.truncate(f"{romFile}.journal", records[insert_id]["offset"])
+    return restored
+
+###WATCH
+def get_mtimes(files):
+    """
+    Returns the modification time of each file, None for missing files.
+    """
+    mtimes = []
+    for file in files:
+        try:
+            mtimes.append(os.stat(file).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return mtimes
+
+def get_file_stamp(file):
+    """
+    Returns the size and modification time of a file, to notice it was written by another tool.
+    """
+    st = os.stat(file)
+    return st.st_size, st.st_mtime_ns
+
+def watch_insert(script_file, romFile, tblFile, configs, interval=0.25, debounce=0.3):
+    """
+    Keeps the tbl, the insert caches and the ROM image in memory and inserts the script
+    every time it is saved, until interrupted with Ctrl+C.
+
+    Script files are polled by modification time, and an insert only starts once they
+    stopped changing for the debounce time, so a burst of saves is inserted once. The
+    ROM image is loaded again before an insert if the ROM changed on disk (a -rollback,
+    an emulator or another tool), so the insert compares against the current bytes.
+
+    Parameters:
+        script_file (str): The path to the script file (numbered for multi-section games).
+        romFile (str): The path to the ROM file.
+        tblFile (str): The path to the .tbl file, it is parsed again only when it changes.
+        configs (list): The GameConfig of every section.
+        interval (float): Seconds between checks.
+        debounce (float): Seconds the files must stay unchanged before inserting.
+    """
+    rom = RomImage(romFile)
+    rom_stamp = get_file_stamp(romFile)
+    script_files = [get_section_file(script_file, i, len(configs)) for i in range(len(configs))]
+    watched = script_files + [tblFile]
+    caches = [{} for _ in configs]
+    inserted_mtimes = None
+    print(f"Watching {', '.join(script_files)}, press Ctrl+C to stop.")
+    try:
+        while True:
+            mtimes = get_mtimes(watched)
+            if mtimes == inserted_mtimes:
+                time.sleep(interval)
+                continue
+            time.sleep(debounce)
+            if get_mtimes(watched) != mtimes:
+                continue
+            inserted_mtimes = mtimes
+
+            start = time.perf_counter()
+            try:
+                if get_file_stamp(romFile) != rom_stamp:
+                    rom = RomImage(romFile)
+                    rom_stamp = get_file_stamp(romFile)
+                    print("ROM changed on disk, reloaded.")
+                char_table = load_tbl(tblFile)
+                results = [insert_script(readScriptFile(file), rom, char_table, config, cache)
+                           for file, config, cache in zip(script_files, configs, caches)]
+                rom.commit(get_journal_entry(script_file, configs, results))
+                save_rom_profile(romFile, configs)
+                rom_stamp = get_file_stamp(romFile)
+            except (OSError, ValueError) as e:
+                rom.discard()
+                print(e)
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"[{time.strftime('%H:%M:%S')}] Inserted in {elapsed:.0f} ms.")
+            for config, (charmap_freespace, script_freespace, ptr_table_freespace, _) in zip(configs, results):
+                print(f"  {config.section or hex(config.script_offset)}: {charmap_freespace} chars free, "
+                      f"{script_freespace} bytes free, {ptr_table_freespace//2} lines/pointers left.")
+    except KeyboardInterrupt:
+        print("Watch stopped.")
+
+###BATCH
+def readBatchManifest(manifestFile):
+    """
+    Reads a batch manifest, made of [batch] blocks like the [config] blocks of GAME_CONFIGS.txt:
+
+        [batch]
+        rom = Barbie (USA).nes
+        profile = auto
+        tbl = decode.tbl
+        script = barbie.bin
+
+    profile is "auto" (find the game by CRC32) or a CRC32 from GAME_CONFIGS.txt, and an
+    optional "section = N" keeps only that section of a multi-section game. Relative
+    paths are relative to the manifest.
+
+    Parameters:
+        manifestFile (str): The path to the manifest file.
+
+    Returns:
+        list: A list of dictionaries with the keys rom, profile, tbl, script and section.
+    """
+    base = os.path.dirname(os.path.abspath(manifestFile))
+    entries = []
+    with open(manifestFile, "r", encoding='UTF-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("//") or line.startswith(";"):
+                continue
+            if line == "[batch]":
+                entries.append({"profile": "auto", "section": None})
+            elif "=" in line and entries:
+                key, value = line.split("=", 1)
+                key = key.strip()
+                value = value.strip()
+                if key in ("rom", "tbl", "script"):
+                    value = os.path.join(base, value)
+                elif key == "section":
+                    value = int(value)
+                entries[-1][key] = value
+    return entries
+
+def resolve_game_configs(romFile, profile="auto", section=None):
+    """
+    Returns the configs of a batch entry.
+
+    Parameters:
+        romFile (str): The path to the ROM file.
+        profile (str): "auto" or a CRC32 in GAME_CONFIGS.txt.
+        section (int): The section to keep, starting at 1, or None for every section.
+
+    Returns:
+        list: The GameConfig of the selected sections.
+
+    Raises:
+        ValueError: If the game or the section is not found.
+    """
+    if profile == "auto":
+        configs = find_game_configs(romFile, GAME_CONFIGS_FILE)
+    else:
+        configs = [copy.copy(config) for config in load_game_configs(GAME_CONFIGS_FILE).get(int(profile, 16), [])]
+    if not configs:
+        raise ValueError(f"No config found for {romFile} (profile {profile}).")
+    if section is not None:
+        if not 1 <= section <= len(configs):
+            raise ValueError(f"{configs[0].name} has no section {section}.")
+        return [configs[section - 1]]
+    return configs
+
+def get_error_message(error):
+    """
+    Returns the summary text of an exception, with its type when it is not an expected
+    OSError or ValueError.
+    """
+    if isinstance(error, (OSError, ValueError)):
+        return str(error)
+    return f"{type(error).__name__}: {error}"
+
+def run_batch_job(mode, entries, cache_dir=None):
+    """
+    Runs the extract or insert pipeline for every entry of one ROM.
+
+    Entries of the same ROM run in the same job, in order, so inserts never race.
+
+    Parameters:
+        mode (str): "d" to extract, "c" to insert or "ci" to insert incrementally.
+        entries (list): The manifest entries, all with the same rom.
+        cache_dir (str): The extraction cache directory, see extract_script.
+
+    Returns:
+        list: One summary dictionary per section, a failed section has an "error" key
+            instead of raising, so one bad entry does not stop the other jobs.
+    """
+    summary = []
+    inserted = []
+    rom = None
+    failed = False
+    for entry in entries:
+        try:
+            configs = resolve_game_configs(entry["rom"], entry["profile"], entry["section"])
+            if rom is None:
+                rom = RomImage(entry["rom"])
+            char_table = load_tbl(entry["tbl"])
+        except Exception as e:
+            summary.append({"rom": entry["rom"], "section": "", "error": get_error_message(e)})
+            failed = True
+            continue
+        for i, config in enumerate(configs):
+            row = {"rom": entry["rom"], "section": f"{config.name} {config.section}".strip()}
+            script_file = get_section_file(entry["script"], i, len(configs))
+            try:
+                if mode == "d":
+                    extract_script(rom, script_file, char_table, config, cache_dir=cache_dir)
+                    row["script"] = script_file
+                else:
+                    cache_file = f"{script_file}.cache" if mode == "ci" else None
+                    script = readScriptFile(script_file)
+                    result = insert_script(script, rom, char_table, config, cache_file)
+                    charmap_free, script_free, ptr_table_free, _ = result
+                    inserted.append((script_file, config, result))
+                    row.update(charmap_free=charmap_free, script_free=script_free, ptr_table_free=ptr_table_free)
+            except Exception as e:
+                # Any failure stays in the summary, so the other jobs of the pool still report
+                row["error"] = get_error_message(e)
+                failed = True
+            summary.append(row)
+    if mode != "d" and rom is not None:
+        if failed:
+            for row in summary:
+                if "error" not in row:
+                    row["error"] = "Not written, another section of this ROM failed."
+        else:
+            try:
+                rom.commit(get_journal_entry(", ".join(file for file, _, _ in inserted),
+                                             [config for _, config, _ in inserted], [result for _, _, result in inserted]))
+                save_rom_profile(rom.path, [config for _, config, _ in inserted])
+            except OSError as e:
+                for row in summary:
+                    row.setdefault("error", str(e))
+    return summary
+
+def run_batch(mode, manifestFile, workers=None, cache_dir=None):
+    """
+    Runs a batch manifest with a process pool, one job per ROM.
+
+    Parameters:
+        mode (str): "d" to extract, "c" to insert or "ci" to insert incrementally.
+        manifestFile (str): The path to the manifest file.
+        workers (int): The number of worker processes, the CPU count by default.
+        cache_dir (str): The extraction cache directory shared by the jobs, see extract_script.
+
+    Returns:
+        list: The summary rows of every section, in manifest order.
+    """
+    jobs = {}
+    for entry in readBatchManifest(manifestFile):
+        jobs.setdefault(os.path.abspath(entry["rom"]), []).append(entry)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(run_batch_job, [mode] * len(jobs), list(jobs.values()), [cache_dir] * len(jobs))
+        return [row for rows in results for row in rows]
+
+###SERVE
+class GolombServer:
+    """
+    The state kept warm between requests of the --serve mode: open ROM images, insert
+    caches and call counters. Tables and game configs are cached by load_tbl and
+    find_game_configs.
+    """
+    def __init__(self):
+        self.roms = {}
+        self.insert_caches = {}
+        self.calls = {}
+        self.last_insert_stats = []
+        self.started = time.time()
+
+    def get_rom(self, romFile):
+        """
+        Returns the open RomImage of a ROM, loading it again if the file changed on disk.
+        """
+        path = os.path.abspath(romFile)
+        stamp = get_file_stamp(path)
+        cached = self.roms.get(path)
+        if cached is None or cached[1] != stamp:
+            cached = (RomImage(path), stamp)
+            self.roms[path] = cached
+        return cached[0]
+
+    def saved(self, rom):
+        """
+        Remembers the new stamp of a ROM after a commit, so it is not read again.
+        """
+        self.roms[rom.path] = (rom, get_file_stamp(rom.path))
+
+    def get_config(self, params):
+        section = params.get("section", 1)
+        return resolve_game_configs(params["rom"], params.get("profile", "auto"), section)[0]
+
+    def decode_message(self, params):
+        """
+        Params: rom, tbl, ids ("1,4,10-12" or a list), profile ("auto"), section (1).
+        Returns the text of each message by id.
+        """
+        rom = self.get_rom(params["rom"])
+        char_table = load_tbl(params["tbl"])
+        config = self.get_config(params)
+        ids = params["ids"]
+        message_ids = parse_message_ids(ids) if isinstance(ids, str) else [int(i) for i in ids]
+        charmap, charmaps_size = get_charmaps(rom, config.charmap_offset, config.charmap_size, char_table)
+        messages = read_messages(rom, message_ids, config.script_offset, config.ptr_table_offset,
+                                 config.ptr_table_size, charmap, charmaps_size, config.line_breaker, char_table,
+                                 config.ptr_table_aliases)
+        return {str(message_id): text for message_id, text in messages.items()}
+
+    def encode_and_measure(self, params):
+        """
+        Params: rom, tbl, text, profile, section.
+        Returns the compressed size of the text with the charmap in the ROM, and the
+        chars it is missing (those need a new insert to get a charmap entry).
+        """
+        rom = self.get_rom(params["rom"])
+        char_table = load_tbl(params["tbl"])
+        config = self.get_config(params)
+        charmap, _ = get_charmaps(rom, config.charmap_offset, config.charmap_size, char_table)
+        tiers = {}
+        for tier, alphabet in enumerate(charmap):
+            for char in alphabet:
+                tiers.setdefault(char, tier)
+        nybbles = 0
+        missing = []
+        for byte in char_table.encode(params["text"]):
+            char = char_table.get_char(byte)
+            if char not in tiers:
+                missing.append(char)
+            nybbles += 1 if tiers.get(char) == 0 else 2
+        return {"bytes": (nybbles + 1) // 2, "nybbles": nybbles, "missing": sorted(set(missing))}
+
+    def insert(self, params):
+        """
+        Params: rom, tbl, script (a script file) or lines (a list of messages), profile,
+        section, ips (write an IPS patch instead of saving the ROM), stats (keep the stage
+        timings for the stats method, they slow the insert down).
+        Inserts incrementally with an insert cache kept in memory.
+        """
+        rom = self.get_rom(params["rom"])
+        char_table = load_tbl(params["tbl"])
+        config = self.get_config(params)
+        script = params["lines"] if "lines" in params else readScriptFile(params["script"])
+        if not isinstance(script, list) or not all(isinstance(line, str) for line in script):
+            raise TypeError("lines must be a list of strings")
+        cache = self.insert_caches.setdefault((rom.path, config.section), {})
+        stats = PipelineStats(f"{config.name} {config.section}".strip()) if params.get("stats") else None
+        try:
+            charmap_free, script_free, ptr_table_free, saved_bytes = insert_script(
+                script, rom, char_table, config, cache, stats)
+        except Exception:
+            rom.discard()
+            cache.clear()
+            raise
+        if params.get("ips"):
+            with pipeline_stage(stats, "write_ips"):
+                create_ips_patch(rom, params["ips"])
+            rom.discard()
+        else:
+            with pipeline_stage(stats, "commit_rom"):
+                rom.commit(get_journal_entry("serve", [config], [(charmap_free, script_free, ptr_table_free, saved_bytes)]))
+                save_rom_profile(rom.path, [config])
+            self.saved(rom)
+        if stats is not None:
+            self.last_insert_stats = [stats.to_dict()]
+        return {"charmap_free": charmap_free, "script_free": script_free,
+                "ptr_table_free": ptr_table_free, "optimizer_saved_bytes": saved_bytes}
+
+    def stats(self, params):
+        """
+        Returns the calls and time of every method, the open ROMs and the stats of the last insert.
+        """
+        return {"uptime": time.time() - self.started,
+                "calls": {method: {"count": count, "seconds": seconds}
+                          for method, (count, seconds) in self.calls.items()},
+                "roms": sorted(self.roms),
+                "last_insert": self.last_insert_stats}
+
+    METHODS = ("decode_message", "encode_and_measure", "insert", "stats")
+
+    def handle(self, request):
+        """
+        Runs one JSON-RPC 2.0 request.
+
+        Returns:
+            dict: The response, or None for a notification (a request without id), which
+                gets no reply even when it fails.
+        """
+        if not isinstance(request, dict):
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}}
+        request_id = request.get("id")
+        method = request.get("method")
+        if method not in self.METHODS:
+            error = {"code": -32601, "message": f"Method not found: {method}"}
+            return {"jsonrpc": "2.0", "id": request_id, "error": error} if "id" in request else None
+        start = time.perf_counter()
+        try:
+            response = {"jsonrpc": "2.0", "id": request_id,
+                        "result": getattr(self, method)(request.get("params") or {})}
+        except (KeyError, TypeError) as e:
+            response = {"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": -32602, "message": f"Invalid params: {e}"}}
+        except (OSError, ValueError) as e:
+            response = {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32000, "message": str(e)}}
+        except Exception as e:
+            # Any other failure only ends this request, the server keeps running
+            response = {"jsonrpc": "2.0", "id": request_id,
+                        "error": {"code": -32603, "message": f"Internal error: {type(e).__name__}: {e}"}}
+        calls = self.calls.setdefault(method, [0, 0.0])
+        calls[0] += 1
+        calls[1] += time.perf_counter() - start
+        return response if "id" in request else None
+
+def serve(instream=None, outstream=None):
+    """
+    Answers line-delimited JSON-RPC 2.0 requests until the input ends.
+
+    Parameters:
+        instream (file): Where the requests are read from, stdin by default.
+        outstream (file): Where the responses are written, stdout by default.
+    """
+    instream = instream if instream is not None else sys.stdin
+    outstream = outstream if outstream is not None else sys.stdout
+    server = GolombServer()
+    for line in instream:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": f"Parse error: {e}"}}
+        else:
+            response = server.handle(request)
+        if response is not None:
+            outstream.write(json.dumps(response) + "\n")
+            outstream.flush()
+
+def print_usage():
+    sys.stdout.write("Usage: -d <romFile> <outFile> <tblFile>\n")
+    sys.stdout.write("       -c <outFile> <romFile> <tblFile>\n")
+    sys.stdout.write("       -ci <outFile> <romFile> <tblFile> incremental insert, caches the script in <outFile>.cache.\n")
+    sys.stdout.write("       -p <romFile> <tblFile> <messageIds> decode messages through the pointer table.\n")
+    sys.stdout.write("       -m <outFile> <messageId> [text] print or replace one message of a script file.\n")
+    sys.stdout.write("       --index with -d, also write the <outFile>.idx message index used by -m.\n")
+    sys.stdout.write("       -x <romFile> <tblFile> check the pointer table against the script.\n")
+    sys.stdout.write("       -verify <outFile> <romFile> <tblFile> check the ROM decodes back to the script.\n")
+    sys.stdout.write("       -a <outFile> <romFile> <tblFile> list the messages and chars that cost the most space.\n")
+    sys.stdout.write("       -w <outFile> <romFile> <tblFile> insert every time the script is saved.\n")
+    sys.stdout.write("       -b <d|c|ci> <manifestFile> extract or insert every ROM in a manifest.\n")
+    sys.stdout.write("       --stats <file|-> with -d/-c/-ci, write stage timings and codec counters as JSON.\n")
+    sys.stdout.write("       --stats-memory with --stats, also trace the peak memory of every stage (slower).\n")
+    sys.stdout.write("       --cache <dir> with -d/-b d, reuse the scripts decoded from the same blocks.\n")
+    sys.stdout.write("       --ips <file> with -c/-ci, write an IPS patch instead of modifying the ROM.\n")
+    sys.stdout.write("       -apply-ips <ipsFile> <romFile> <outRomFile> apply an IPS patch to a copy of a ROM.\n")
+    sys.stdout.write("       --relocate with -c/-ci, move a block that does not fit to free space in its bank.\n")
+    sys.stdout.write("       -f <romFile> list the free space of every bank and where the blocks may be referenced.\n")
+    sys.stdout.write("       -history <romFile> list the journaled inserts and their free space.\n")
+    sys.stdout.write("       -rollback <romFile> [insertId] undo the last insert, or go back to insertId (0 for before the first).\n")
+    sys.stdout.write("       -s <romFile> <tblFile> scan a new ROM for charmaps, scripts and pointer tables.\n")
+    sys.stdout.write("       --profile <file> write a cProfile dump of the run.\n")
+    sys.stdout.write("       --serve answer JSON-RPC requests on stdin, one per line.\n")
+    sys.stdout.write("       -h show help.\n")
+    sys.stdout.write("       -v show version.\n")
+
+if __name__ == "__main__":
+    def pop_option(name):
+        # Removes "name value" from the command line and returns value
+        if name not in sys.argv[:-1]:
+            return None
+        i = sys.argv.index(name)
+        value = sys.argv[i + 1]
+        del sys.argv[i:i + 2]
+        return value
+
+    # --stats <file|-> writes the stage timings and codec counters as JSON
+    stats_file = pop_option('--stats')
+    # --stats-memory adds the peak memory of every stage, the times are slower then
+    stats_memory = '--stats-memory' in sys.argv
+    if stats_memory:
+        sys.argv.remove('--stats-memory')
+    # With --stats - the JSON is the only output on stdout, the messages go to stderr
+    stats_out = sys.stdout
+    if stats_file == '-':
+        sys.stdout = sys.stderr
+    # --ips <file> writes the -c/-ci changes as an IPS patch instead of saving the ROM
+    ips_file = pop_option('--ips')
+    # --index writes the <outFile>.idx message index with -d, for -m
+    write_index = '--index' in sys.argv
+    if write_index:
+        sys.argv.remove('--index')
+    # --cache <dir> keeps decoded scripts for -d and -b d, keyed by the blocks they come from
+    cache_dir = pop_option('--cache')
+    # --relocate lets -c/-ci move a block that does not fit to free space in its bank
+    relocate = '--relocate' in sys.argv
+    if relocate:
+        sys.argv.remove('--relocate')
+    # --profile <file> writes a cProfile dump for pstats/snakeviz
+    profile_file = pop_option('--profile')
+    if profile_file:
+        import atexit
+        import cProfile
+        profiler = cProfile.Profile()
+        def dump_profile():
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+        atexit.register(dump_profile)
+        profiler.enable()
+    all_stats = []
+
+    def new_stats(config):
+        if stats_file is None:
+            return None
+        all_stats.append(PipelineStats(f"{config.name} {config.section}".strip(), stats_memory))
+        return all_stats[-1]
+
+    def write_stats():
+        if stats_file is None:
+            return
+        stats_json = json.dumps([stats.to_dict() for stats in all_stats], indent=2)
+        if stats_file == '-':
+            stats_out.write(stats_json + "\n")
+        else:
+            with open(stats_file, "w", encoding='utf-8') as f:
+                f.write(stats_json + "\n")
+
+    if len(sys.argv) < 2:
+        print_usage()
+        sys.exit(1)
+    
+    # Option
+    option = sys.argv[1]
+    ##CONFIG############################################
+    ##Used when the ROM is not in GAME_CONFIGS.txt######
+    ##EDIT HERE#########################################
+    script_offset = 0x1185
+    script_size = 0xC01
+    charmap_offset = 0x114F
+    charmap_size = 0x36
+    ptr_table_offset = 0x1D88
+    ptr_table_size = 0x68
+    ptr_table_sections = [24,25]
+    line_breaker = 0x00
+    dedup_messages = False
+    ptr_table_aliases = [] #[(23,24)] for Barbie
+    ####################################################
+    default_config = GameConfig(script_offset, script_size, charmap_offset, charmap_size, ptr_table_offset,
+                                ptr_table_size, ptr_table_sections, line_breaker,
+                                dedup_messages=dedup_messages, ptr_table_aliases=ptr_table_aliases)
+
+    def get_configs(rom_path):
+        configs = find_game_configs(rom_path, GAME_CONFIGS_FILE)
+        if configs is None:
+            return [default_config]
+        for config in configs:
+            print(f"Config: {config.name} {config.section}".rstrip())
+        return configs
+    
+    # Decompress
+    if option == '-d' and len(sys.argv) == 5:
+        configs = get_configs(sys.argv[2])
+        rom_file = RomImage(sys.argv[2])
+        char_table = load_tbl(sys.argv[4])
+
+        for i, config in enumerate(configs):
+            out_file = get_section_file(sys.argv[3], i, len(configs))
+            try:
+                charmap = extract_script(rom_file, out_file, char_table, config, new_stats(config), cache_dir,
+                                         write_index)
+            except ValueError as e:
+                print(e)
+                exit()
+            print("------- CHAR MAPS -------\n")
+            print(charmap)
+            print(f"CHARMAP BLOCK SIZE: {config.charmap_size} / {hex(config.charmap_size)} bytes.")
+            print(f"TEXT BLOCK SIZE: {config.script_size} / {hex(config.script_size)} bytes.")
+            print(f"PTR_TABLE BLOCK SIZE: {config.ptr_table_size} / {hex(config.ptr_table_size)} bytes.")
+            print(f"Text extracted to {out_file}")
+        print("Decoding complete.\n")
+        write_stats()
+        
+    # Compress
+    elif option in ('-c', '-ci') and len(sys.argv) == 5:
+        configs = get_configs(sys.argv[3])
+        rom_file = RomImage(sys.argv[3])
+        char_table = load_tbl(sys.argv[4])
+
+        results = []
+        for i, config in enumerate(configs):
+            out_file = get_section_file(sys.argv[2], i, len(configs))
+            # Incremental insert keeps a cache next to the script
+            cache_file = f"{out_file}.cache" if option == '-ci' else None
+
+            # Read decompressed script
+            script = readScriptFile(out_file)
+            # Compress and write data to ROM if pass len checks
+            reserved = [block for other in configs if other is not config for block in get_config_blocks(other)]
+            try:
+                results.append(insert_script(script, rom_file, char_table, config, cache_file, new_stats(config),
+                                             relocate, reserved))
+            except ValueError as e:
+                print(e)
+                exit()
+        # One write saves every section, it is timed in the stats of the last one
+        write_stats_of = all_stats[-1] if all_stats else None
+        if ips_file:
+            with pipeline_stage(write_stats_of, "write_ips"):
+                changed = create_ips_patch(rom_file, ips_file)
+            print(f"IPS patch written to {ips_file}, {changed} bytes changed. The ROM was not modified.")
+        else:
+            with pipeline_stage(write_stats_of, "commit_rom"):
+                rom_file.commit(get_journal_entry(sys.argv[2], configs, results))
+                profile_saved = save_rom_profile(sys.argv[3], configs)
+            if not profile_saved and relocate:
+                for config in configs:
+                    print(f"Set script_offset = {hex(config.script_offset)}, script_size = {hex(config.script_size)}, "
+                          f"ptr_table_offset = {hex(config.ptr_table_offset)}, ptr_table_size = {hex(config.ptr_table_size)} in EDIT HERE.")
+        for config, (charmap_freespace, script_freespace, ptr_table_freespace, saved_bytes) in zip(configs, results):
+            print(f"Charmap optimizer saved {saved_bytes} bytes over the greedy charmap.")
+            print(f"CharMap write to address {hex(config.charmap_offset)}, {charmap_freespace} chars free.")
+            print(f"Script text write to address {hex(config.script_offset)}, {script_freespace} bytes free.")
+            print(f"Pointer table write to address {hex(config.ptr_table_offset)}, {ptr_table_freespace//2} lines/pointers left.")
+        write_stats()
+        
+    # Decode messages through the pointer table
+    elif option == '-p' and len(sys.argv) == 5:
+        configs = get_configs(sys.argv[2])
+        rom_file = RomImage(sys.argv[2])
+        char_table = load_tbl(sys.argv[3])
+        message_ids = parse_message_ids(sys.argv[4])
+
+        for config in configs:
+            try:
+                charmap, charmaps_size = get_charmaps(rom_file, config.charmap_offset, config.charmap_size, char_table)
+            except ValueError as e:
+                print(e)
+                exit()
+            messages = read_messages(rom_file, message_ids, config.script_offset, config.ptr_table_offset,
+                                     config.ptr_table_size, charmap, charmaps_size, config.line_breaker, char_table,
+                                     config.ptr_table_aliases)
+            for message_id, text in messages.items():
+                print(f"@{message_id}")
+                print(text)
+
+    # Check pointer table
+    elif option == '-x' and len(sys.argv) == 4:
+        configs = get_configs(sys.argv[2])
+        rom_file = RomImage(sys.argv[2])
+        char_table = load_tbl(sys.argv[3])
+
+        failed = False
+        for config in configs:
+            compressed_data = read_rom(rom_file, config.script_offset, config.script_size)
+            try:
+                charmap, charmaps_size = get_charmaps(rom_file, config.charmap_offset, config.charmap_size, char_table)
+            except ValueError as e:
+                print(e)
+                exit()
+            message_ends = parse_ptr_table(read_rom(rom_file, config.ptr_table_offset, config.ptr_table_size),
+                                           config.ptr_table_aliases)
+            mismatches = check_ptr_table(message_ends, compressed_data, charmap, charmaps_size, config.line_breaker,
+                                         char_table, config.dedup_messages)
+            for message_id, pointer, decoded in mismatches:
+                print(f"Message {message_id}: pointer ends at {hex(pointer)}, script line ends at {hex(decoded) if decoded is not None else 'none'}.")
+            print(f"{len(message_ends)} pointers checked, {len(mismatches)} mismatches.")
+            failed = failed or bool(mismatches)
+        if failed:
+            sys.exit(1)
+
+    # Verify an insert, writes nothing
+    elif option == '-verify' and len(sys.argv) == 5:
+        configs = get_configs(sys.argv[3])
+        rom_file = RomImage(sys.argv[3])
+        char_table = load_tbl(sys.argv[4])
+
+        failed = False
+        for i, config in enumerate(configs):
+            out_file = get_section_file(sys.argv[2], i, len(configs))
+            script = readScriptFile(out_file)
+            try:
+                mismatches = verify_script(script, rom_file, char_table, config)
+            except ValueError as e:
+                print(e)
+                sys.exit(1)
+            for message_id, reason in mismatches[:10]:
+                print(f"Message {message_id}: {reason}")
+            if len(mismatches) > 10:
+                print(f"... and {len(mismatches) - 10} more.")
+            print(f"{out_file}: {len(script)} messages checked, {len(mismatches)} mismatches.")
+            failed = failed or bool(mismatches)
+        if failed:
+            sys.exit(1)
+
+    # Analyze the script size, the ROM is only read to find its config
+    elif option == '-a' and len(sys.argv) == 5:
+        configs = get_configs(sys.argv[3])
+        char_table = load_tbl(sys.argv[4])
+
+        for i, config in enumerate(configs):
+            out_file = get_section_file(sys.argv[2], i, len(configs))
+            try:
+                analysis = analyze_script(readScriptFile(out_file), char_table, config)
+            except ValueError as e:
+                print(e)
+                exit()
+            print(f"{out_file}: script {analysis['script_bytes']} / {config.script_size} bytes, "
+                  f"charmap {analysis['charmap_bytes']} / {config.charmap_size} bytes.")
+            if analysis['script_bytes'] > config.script_size:
+                print(f"Remove {analysis['script_bytes'] - config.script_size} bytes.")
+            print("Most expensive messages:")
+            for message_id, size, escapes, text in analysis['lines']:
+                print(f"  {message_id}: {size} bytes, {escapes} 8-bit chars. {text[:60]}")
+            print("8-bit chars, bytes saved by rewriting every use:")
+            for char, tier, uses, saved in analysis['escape_chars']:
+                print(f"  {char!r} (charmap {tier}): {uses} uses, {saved} bytes.")
+
+    # Free space index
+    elif option == '-f' and len(sys.argv) == 3:
+        configs = get_configs(sys.argv[2])
+        rom_file = RomImage(sys.argv[2])
+
+        in_use = [block for config in configs for block in get_config_blocks(config)]
+        for start, end, bank in find_free_space(rom_file, FREE_SPACE_MIN_RUN, in_use):
+            print(f"Bank {bank}: {hex(start)}-{hex(end - 1)}, {end - start} bytes of {rom_file.data[start]:02X}.")
+        banks = get_prg_banks(rom_file.data)
+        for config in configs:
+            for block in ("script", "ptr_table"):
+                offset = getattr(config, f"{block}_offset")
+                refs = find_block_refs(rom_file, offset)
+                print(f"{config.section or config.name} {block} at {hex(offset)} (bank {get_bank(banks, offset)}), "
+                      f"possible {block}_refs: {[tuple(hex(r) for r in ref) if isinstance(ref, tuple) else hex(ref) for ref in refs]}")
+
+    # Scan a new ROM for scripts
+    elif option == '-s' and len(sys.argv) == 4:
+        configs = scan_rom(sys.argv[2], sys.argv[3])
+        if not configs:
+            print("No script found, check the tbl matches the game.")
+            sys.exit(1)
+        print(f"//{os.path.basename(sys.argv[2])}")
+        print(f"//CRC32: {get_rom_crc32(sys.argv[2])[0]:08X}")
+        for config in configs:
+            print(f"\n//score {config.score:.2f}, {config.coverage:.0%} of the line breaks have a pointer")
+            print("[config]")
+            print(f"script_offset = {hex(config.script_offset)}")
+            print(f"script_size = {hex(config.script_size)}")
+            print(f"charmap_offset = {hex(config.charmap_offset)}")
+            print(f"charmap_size = {hex(config.charmap_size)}")
+            print(f"ptr_table_offset = {hex(config.ptr_table_offset)}")
+            print(f"ptr_table_size = {hex(config.ptr_table_size)}")
+            print(f"ptr_table_sections = {config.ptr_table_sections}")
+            print(f"line_breaker = 0x{config.line_breaker:02X}")
+
+    # Read or replace one message of a script file through its index
+    elif option == '-m' and len(sys.argv) in (4, 5):
+        try:
+            if len(sys.argv) == 4:
+                print(read_script_message(sys.argv[2], sys.argv[3]))
+            else:
+                replace_script_message(sys.argv[2], sys.argv[3], sys.argv[4])
+                print(f"Message {sys.argv[3]} replaced in {sys.argv[2]}.")
+        except KeyError:
+            print(f"ERROR: {sys.argv[2]} has no message @{sys.argv[3]}.")
+            sys.exit(1)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+
+    # Journal of the inserts
+    elif option == '-history' and len(sys.argv) == 3:
+        records = read_rom_journal(sys.argv[2])
+        if not records:
+            print(f"No inserts journaled for {sys.argv[2]}.")
+        for record in records:
+            changed = sum(end - start for start, end in record["ranges"])
+            print(f"{record['id']}: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['time']))} "
+                  f"{record['source']}, {changed} bytes changed.")
+            for section in record["sections"]:
+                print(f"    {section['section'] or 'script'}: {section['charmap_free']} chars free, "
+                      f"{section['script_free']} bytes free, {section['ptr_table_free']//2} lines/pointers left.")
+
+    # Roll back to an insert of the journal
+    elif option == '-rollback' and len(sys.argv) in (3, 4):
+        try:
+            insert_id = int(sys.argv[3]) if len(sys.argv) == 4 else None
+            restored = rollback_rom(sys.argv[2], insert_id)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print(f"{restored} bytes restored, {len(read_rom_journal(sys.argv[2]))} inserts left in the journal.")
+
+    # Apply an IPS patch to a copy of a clean ROM
+    elif option == '-apply-ips' and len(sys.argv) == 5:
+        try:
+            shutil.copyfile(sys.argv[3], sys.argv[4])
+            rom_file = RomImage(sys.argv[4])
+            records = apply_ips_patch(sys.argv[2], rom_file)
+        except (OSError, ValueError) as e:
+            if os.path.exists(sys.argv[4]):
+                os.remove(sys.argv[4])
+            print(e if str(e).startswith("ERROR:") else f"ERROR: {e}")
+            sys.exit(1)
+        rom_file.commit()
+        print(f"{records} records applied, patched ROM written to {sys.argv[4]}.")
+
+    # Watch
+    elif option == '-w' and len(sys.argv) == 5:
+        configs = get_configs(sys.argv[3])
+        watch_insert(sys.argv[2], sys.argv[3], sys.argv[4], configs)
+
+    # Batch
+    elif option == '-b' and len(sys.argv) == 4 and sys.argv[2] in ('d', 'c', 'ci'):
+        summary = run_batch(sys.argv[2], sys.argv[3], cache_dir=cache_dir)
+        failed = False
+        for row in summary:
+            if "error" in row:
+                print(f"{row['rom']} {row['section']}: {row['error']}")
+                failed = True
+            elif "script" in row:
+                print(f"{row['rom']} {row['section']}: text extracted to {row['script']}.")
+            else:
+                print(f"{row['rom']} {row['section']}: {row['charmap_free']} chars free, "
+                      f"{row['script_free']} bytes free, {row['ptr_table_free']//2} lines/pointers left.")
+        if failed:
+            sys.exit(1)
+
+    # Editor integration
+    elif option == '--serve' and len(sys.argv) == 2:
+        serve()
+
     elif option == '-v' or option == '?':
         print("Golomb Text Decompressor/Compressor by koda v0.1")
         
     else:
-        sys.stdout.write("Usage: -d <romFile> <outFile> <tblFile>\n")
-        sys.stdout.write("       -c <outFile> <romFile> <tblFile>\n")
-        sys.stdout.write("       -h show help.\n")
-        sys.stdout.write("       -v show version.\n")
+        print_usage()
         sys.exit(1)
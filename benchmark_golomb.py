@@ -0,0 +1,181 @@
+## benchmark_golomb.py
+## Times every stage of Imagineering_golomb.py on the scripts in "Original Scripts"
+## and on synthetic scripts made by repeating them. The ROM images are synthetic, no
+## ROM file is needed.
+##
+## Usage: benchmark_golomb.py [--scales 1,10,100] [--repeat 5] [--output result.json]
+##                            [--baseline baseline.json] [--threshold 0.10] [--min-ms 1.0]
+
+import gc
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import platform
+import tempfile
+import statistics
+
+import Imagineering_golomb as golomb
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(ROOT, "Original Scripts")
+TBL_FILE = os.path.join(ROOT, "encode.tbl")
+
+def timed(timings, name, repeat, func, *args):
+    """
+    Runs func(*args) repeat times and stores the median time in timings[name], a single
+    slow or fast run does not move it.
+
+    Returns:
+        The result of the last call.
+    """
+    times = []
+    # Like timeit, a garbage collection in the middle of a run is not timed
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func(*args)
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    timings[name] = statistics.median(times)
+    return result
+
+def build_rom_image(path, new_charmap_raw, new_script, new_ptr_table):
+    """
+    Writes a synthetic ROM with the charmap, script and pointer table one after another.
+
+    Returns:
+        GameConfig: The location of the blocks in the synthetic ROM.
+    """
+    charmap_offset = 0x10
+    script_offset = charmap_offset + len(new_charmap_raw)
+    ptr_table_offset = script_offset + len(new_script)
+    rom = bytearray(b"NES\x1a") + bytearray(12)
+    rom += new_charmap_raw + new_script + new_ptr_table
+    with open(path, "wb") as f:
+        f.write(rom)
+    return golomb.GameConfig(script_offset, len(new_script), charmap_offset, len(new_charmap_raw),
+                             ptr_table_offset, len(new_ptr_table), [])
+
+def bench_script(script, repeat, rom_path):
+    """
+    Times every stage of the extract and insert pipelines on one script.
+
+    Returns:
+        dict: The median time in seconds of every stage, and the script sizes.
+    """
+    timings = {}
+    timed(timings, "readTbl", repeat, golomb.readTbl, TBL_FILE)
+    char_table = timed(timings, "CharTable", repeat, golomb.CharTable, TBL_FILE)
+
+    # Insert
+    encoded_script, frecuency_table = timed(timings, "encode_chars_and_give_frecuency", repeat,
+                                            golomb.encode_chars_and_give_frecuency, script, char_table)
+    timed(timings, "create_charmap", repeat, golomb.create_charmap, frecuency_table)
+    charmap0_size = golomb.get_charmap0_size(len(frecuency_table))
+    charmap, new_charmap_raw, _, _, _ = timed(timings, "optimize_charmap", repeat, golomb.optimize_charmap,
+                                              encoded_script, frecuency_table, [charmap0_size])
+    new_script, new_script_size, lines_lenghts = timed(timings, "compress_script", repeat,
+                                                       golomb.compress_script, encoded_script, charmap)
+    new_ptr_table, _ = timed(timings, "create_ptr_table", repeat, golomb.create_ptr_table, lines_lenghts, [])
+
+    # Extract
+    config = build_rom_image(rom_path, new_charmap_raw, new_script, new_ptr_table)
+    rom = golomb.RomImage(rom_path)
+    compressed_data = timed(timings, "read_rom", repeat, golomb.read_rom, rom, config.script_offset, config.script_size)
+    charmap, charmaps_size = timed(timings, "get_charmaps", repeat, golomb.get_charmaps,
+                                   rom, config.charmap_offset, config.charmap_size, char_table)
+    decode_table = timed(timings, "build_decode_table", repeat, golomb.build_decode_table,
+                         charmap, charmaps_size, char_table.get_char(config.line_breaker))
+    timed(timings, "iter_golomb_lines", repeat, lambda: list(golomb.iter_golomb_lines(compressed_data, decode_table)))
+    decoded = timed(timings, "decompress_golomb", repeat, golomb.decompress_golomb,
+                    compressed_data, charmap, charmaps_size, config.line_breaker, char_table)
+    if len(decoded) < len(script):
+        raise RuntimeError(f"Round trip lost lines: {len(decoded)} decoded, {len(script)} in the script.")
+
+    return {"lines": len(script), "script_bytes": new_script_size, "stages": timings}
+
+def run_benchmark(scales, repeat):
+    """
+    Benchmarks every corpus at every scale.
+
+    Returns:
+        dict: The results, ready to be written as JSON.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        rom_path = os.path.join(temp_dir, "synthetic.nes")
+        for script_file in sorted(glob.glob(os.path.join(CORPUS_DIR, "*", "*.bin"))):
+            game = os.path.basename(os.path.dirname(script_file))
+            corpus = f"{game}/{os.path.basename(script_file)}"
+            script = golomb.readScriptFile(script_file)
+            results[corpus] = {}
+            for scale in scales:
+                results[corpus][f"x{scale}"] = bench_script(script * scale, repeat, rom_path)
+                print(f"{corpus} x{scale} done.", file=sys.stderr)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+def compare(current, baseline, threshold, min_seconds=0.001):
+    """
+    Compares two benchmark results stage by stage, printing every stage to stderr so
+    stdout only holds the JSON result.
+
+    Returns:
+        list: (corpus, scale, stage, baseline time, current time) for every stage slower
+            than the baseline by more than threshold and by more than min_seconds, so
+            stages of a few microseconds do not fail on timer noise.
+    """
+    regressions = []
+    for corpus, scales in current["results"].items():
+        for scale, result in scales.items():
+            base = baseline["results"].get(corpus, {}).get(scale)
+            if base is None:
+                continue
+            for stage, seconds in result["stages"].items():
+                base_seconds = base["stages"].get(stage)
+                if base_seconds is None:
+                    continue
+                print(f"{corpus} {scale} {stage}: {base_seconds * 1000:.3f} ms -> {seconds * 1000:.3f} ms",
+                      file=sys.stderr)
+                if seconds > base_seconds * (1 + threshold) and seconds - base_seconds > min_seconds:
+                    regressions.append((corpus, scale, stage, base_seconds, seconds))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Imagineering Golomb pipeline.")
+    parser.add_argument("--scales", default="1,10,100", help="Comma separated script repetitions (default 1,10,100).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per stage, the median is kept (default 5).")
+    parser.add_argument("--output", help="Write the results to this JSON file (default stdout).")
+    parser.add_argument("--baseline", help="Compare against a previous JSON result.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown reported as regression (default 0.10).")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="Smallest slowdown in milliseconds reported as regression (default 1.0).")
+    args = parser.parse_args()
+
+    current = run_benchmark([int(scale) for scale in args.scales.split(",")], args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+    else:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, args.min_ms / 1000)
+        for corpus, scale, stage, base_seconds, seconds in regressions:
+            print(f"REGRESSION {corpus} {scale} {stage}: {base_seconds * 1000:.3f} ms -> {seconds * 1000:.3f} ms",
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,211 @@
+## Tests for Imagineering_golomb.py, run with: python -m unittest test_imagineering_golomb
+
+import io
+import contextlib
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import Imagineering_golomb as golomb
+
+TBL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "decode.tbl")
+SCRIPTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Original Scripts")
+
+MESSAGES = ["HELLO/WORLD~00~", "A/GLAMOROUS/QUEST~00~", "FULL/OF/FUN,~00~",
+            "MAGIC,/AND/ADVENTURE~00~", "THE/END~00~"]
+
+def make_rom(folder, name="test.nes"):
+    """
+    Writes a synthetic ROM and a GAME_CONFIGS.txt that knows it, with two pointer
+    sections (3 and 2 messages) and a charmap block with the Barbie layout.
+
+    Returns:
+        tuple: The path to the ROM and the path to the configs file.
+    """
+    romFile = os.path.join(folder, name)
+    with open(romFile, "wb") as f:
+        f.write(b"NES\x1a" + bytes(12) + bytes(range(256)) * 8 + b"\xff" * 0x1800)
+    crc32 = golomb.get_rom_crc32(romFile)[1]
+    configsFile = os.path.join(folder, "GAME_CONFIGS.txt")
+    with open(configsFile, "w", encoding='UTF-8') as f:
+        f.write(f"//{name}\n//CRC32: {crc32:08X}\n\n[config]\n"
+                "script_offset = 0x910\nscript_size = 0x100\ncharmap_offset = 0x810\ncharmap_size = 0x36\n"
+                "ptr_table_offset = 0xA10\nptr_table_size = 0x20\nptr_table_sections = [3,2]\n"
+                "line_breaker = 0x00\n")
+    return romFile, configsFile
+
+class OptimizeCharmapTest(unittest.TestCase):
+
+    def test_saving_is_never_negative(self):
+        char_table = golomb.load_tbl(TBL_FILE)
+        script = golomb.readScriptFile(os.path.join(SCRIPTS_FOLDER, "Home Alone 2 - Lost in New York (USA).nes",
+                                                    "script_original.bin"))
+        encoded_script, frequency_chars = golomb.encode_chars_and_give_frecuency(script, char_table)
+        for charmap0_sizes in (None, [13], [14], [15]):
+            with self.subTest(charmap0_sizes=charmap0_sizes):
+                *_, greedy_size, optimized_size = golomb.optimize_charmap(encoded_script, frequency_chars, charmap0_sizes)
+                self.assertGreaterEqual(greedy_size, optimized_size)
+        # Barbie's 0x36 bytes charmap block pins the first charmap to 13 chars
+        self.assertEqual(golomb.optimize_charmap(encoded_script, frequency_chars, [13])[3],
+                         golomb.get_script_size(encoded_script, list(frequency_chars)[:13]))
+
+class SyntheticRomTest(unittest.TestCase):
+    """
+    Runs every test in a temporary folder with a synthetic ROM as the only known game.
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.romFile, configsFile = make_rom(self.folder)
+        patcher = mock.patch.object(golomb, "GAME_CONFIGS_FILE", configsFile)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read_rom_bytes(self):
+        with open(self.romFile, "rb") as f:
+            return f.read()
+
+class ServeTest(SyntheticRomTest):
+
+    def run_requests(self, *requests):
+        """
+        Sends the requests to serve() in one session, a str is sent as is.
+
+        Returns:
+            list: The decoded responses.
+        """
+        lines = [request if isinstance(request, str) else json.dumps(request) for request in requests]
+        out = io.StringIO()
+        golomb.serve(io.StringIO("\n".join(lines) + "\n"), out)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def request(self, request_id, method, **params):
+        params = dict({"rom": self.romFile, "tbl": TBL_FILE}, **params)
+        return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+
+    def test_insert_decode_measure_stats(self):
+        responses = self.run_requests(
+            self.request(1, "insert", lines=MESSAGES, stats=True),
+            self.request(2, "decode_message", ids="1-5"),
+            self.request(3, "encode_and_measure", text="HELLO/QUEST~00~"),
+            self.request(4, "encode_and_measure", text="HELLO/JOY~00~"),
+            self.request(5, "stats"))
+        self.assertEqual([response["id"] for response in responses], [1, 2, 3, 4, 5])
+        self.assertNotIn("error", responses[0])
+        self.assertEqual(responses[1]["result"], {str(i): text for i, text in enumerate(MESSAGES, 1)})
+        self.assertEqual(responses[2]["result"]["missing"], [])
+        self.assertGreater(responses[2]["result"]["bytes"], 0)
+        self.assertEqual(responses[3]["result"]["missing"], ["J", "Y"])
+        stats = responses[4]["result"]
+        self.assertEqual(stats["calls"]["insert"]["count"], 1)
+        self.assertEqual(stats["calls"]["encode_and_measure"]["count"], 2)
+        self.assertEqual(len(stats["last_insert"]), 1)
+        # The ROM was committed and is found again through its profile
+        self.assertEqual(golomb.verify_script(MESSAGES, self.romFile, golomb.load_tbl(TBL_FILE),
+                                              golomb.find_game_configs(self.romFile, golomb.GAME_CONFIGS_FILE)[0]), [])
+
+    def test_malformed_requests(self):
+        original = self.read_rom_bytes()
+        responses = self.run_requests(
+            self.request(1, "insert", lines=MESSAGES[:2]),
+            self.request(2, "insert", lines=[5]),
+            self.request(3, "decode_message"),
+            self.request(4, "encode_and_measure", text=5),
+            {"jsonrpc": "2.0", "method": "unknown"},
+            {"jsonrpc": "2.0", "method": "insert", "params": {"lines": [5]}},
+            {"jsonrpc": "2.0", "id": 5, "method": "unknown"},
+            "{not json",
+            "[1]",
+            self.request(6, "insert", lines=MESSAGES),
+            self.request(7, "decode_message", ids=[5]))
+        errors = {response["id"]: response["error"]["code"] for response in responses if "error" in response}
+        self.assertEqual(errors, {1: -32000, 2: -32602, 3: -32602, 4: -32602, 5: -32601, None: -32600})
+        self.assertEqual([response["error"]["code"] for response in responses if response["id"] is None],
+                         [-32700, -32600])
+        self.assertIn("needs 5", responses[0]["error"]["message"])
+        # The server kept answering after the errors, and saved the last insert
+        self.assertEqual(responses[-1]["result"], {"5": MESSAGES[4]})
+        self.assertNotEqual(self.read_rom_bytes(), original)
+
+    def test_unexpected_error(self):
+        with mock.patch.object(golomb.GolombServer, "encode_and_measure", side_effect=IndexError("boom")):
+            responses = self.run_requests(self.request(1, "encode_and_measure", text="A~00~"),
+                                          {"jsonrpc": "2.0", "method": "encode_and_measure", "params": {}},
+                                          self.request(2, "stats"))
+        self.assertEqual(responses[0]["error"]["code"], -32603)
+        self.assertEqual(responses[1]["result"]["calls"]["encode_and_measure"]["count"], 2)
+
+    def test_failed_insert_writes_nothing(self):
+        original = self.read_rom_bytes()
+        long_messages = MESSAGES[:4] + ["/".join(["ADVENTURE"] * 100) + "~00~"]
+        responses = self.run_requests(self.request(1, "insert", lines=long_messages),
+                                      self.request(2, "insert", lines=MESSAGES[:1]))
+        self.assertEqual([response["error"]["code"] for response in responses], [-32000, -32000])
+        self.assertEqual(self.read_rom_bytes(), original)
+        self.assertFalse(os.path.exists(f"{self.romFile}.journal"))
+
+class BatchTest(SyntheticRomTest):
+
+    def entry(self, lines):
+        script_file = os.path.join(self.folder, f"script{len(lines)}.bin")
+        with open(script_file, "w", encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        return {"rom": self.romFile, "profile": "auto", "section": None, "tbl": TBL_FILE, "script": script_file}
+
+    def test_failed_entry_is_summarized(self):
+        original = self.read_rom_bytes()
+        summary = golomb.run_batch_job("c", [self.entry(MESSAGES), self.entry(MESSAGES[:2])])
+        self.assertEqual(len(summary), 2)
+        self.assertEqual(summary[0]["error"], "Not written, another section of this ROM failed.")
+        self.assertIn("the pointer table needs 5", summary[1]["error"])
+        self.assertEqual(self.read_rom_bytes(), original)
+
+    def test_unexpected_error_is_summarized(self):
+        with mock.patch.object(golomb, "insert_script", side_effect=IndexError("boom")):
+            summary = golomb.run_batch_job("c", [self.entry(MESSAGES)])
+        self.assertEqual(summary[0]["error"], "IndexError: boom")
+        summary = golomb.run_batch_job("c", [self.entry(MESSAGES)])
+        self.assertNotIn("error", summary[0])
+        self.assertEqual(len(golomb.read_rom_journal(self.romFile)), 1)
+
+class WatchTest(SyntheticRomTest):
+
+    def write_script(self, lines, mtime_ns):
+        with open(self.script_file, "w", encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.utime(self.script_file, ns=(mtime_ns, mtime_ns))
+
+    def test_short_script_is_discarded_and_watching_continues(self):
+        self.script_file = os.path.join(self.folder, "script.bin")
+        self.write_script(MESSAGES[:2], 10 ** 18)
+        original = self.read_rom_bytes()
+        configs = golomb.find_game_configs(self.romFile, golomb.GAME_CONFIGS_FILE)
+        sleeps = []
+
+        def sleep(seconds):
+            # 1: debounce of the short script, 2: idle, the full script is saved,
+            # 3: debounce of the full script, 4: idle, stop watching
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                self.assertEqual(self.read_rom_bytes(), original)
+                self.write_script(MESSAGES, 2 * 10 ** 18)
+            elif len(sleeps) == 4:
+                raise KeyboardInterrupt
+
+        out = io.StringIO()
+        with mock.patch.object(golomb.time, "sleep", sleep), \
+                mock.patch.object(golomb.RomImage, "discard", autospec=True,
+                                  side_effect=golomb.RomImage.discard) as discard, \
+                contextlib.redirect_stdout(out):
+            golomb.watch_insert(self.script_file, self.romFile, TBL_FILE, configs)
+        self.assertEqual(discard.call_count, 1)
+        self.assertIn("the pointer table needs 5", out.getvalue())
+        self.assertIn("Inserted in", out.getvalue())
+        self.assertIn("Watch stopped.", out.getvalue())
+        self.assertEqual(golomb.verify_script(MESSAGES, self.romFile, golomb.load_tbl(TBL_FILE), configs[0]), [])
+
+if __name__ == "__main__":
+    unittest.main()